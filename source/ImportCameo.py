@@ -16,9 +16,16 @@
  ------------------------------------------------------------------------------
  """
 #The goal of this tool is to create File GDB and FCs from CAMEO export *.zip
-import sys, os, arcpy, zipfile, glob, shutil, csv, datetime, re
+import sys, os, arcpy, zipfile, glob, shutil, csv, datetime, re, io, locale, functools, posixpath, tempfile, marshal, struct, operator, multiprocessing, mmap, math, itertools, hashlib, json, time, array, mimetypes, heapq
+import concurrent.futures, contextlib
 from datetime import date
 
+try:
+    import numpy
+except ImportError:
+    #numpy ships with ArcGIS Pro, without it only the insert cursor path is available
+    numpy = None
+
 # Defines tables that will be converted to feature classes, x/y fields are specified for each
 NAMES_OF_SPATIAL_TABLES = {
     "Facilities" : {
@@ -52,6 +59,149 @@ TABLES_WITH_ATTACHMENTS = {
 ATTACHMENT_DIR_NAME = "SitePlansTemp"
 SPATIAL_REFERENCE = arcpy.SpatialReference(4326)
 
+# Import options
+# Read the .mer tables straight out of the zip rather than extracting and renaming them on disk.
+# When False the legacy extract -> rename to .csv -> load -> delete workflow is used.
+READ_TABLES_FROM_ZIP = True
+# Parse each table once, inferring the schema while the parsed rows are buffered in a spool file,
+# then insert from the spool. When False the table is parsed twice (get_fields then add_data).
+# Only used for extracted tables (READ_TABLES_FROM_ZIP False) and the worker processes (WORKERS > 1), tables
+# read by zips_to_gdb are always spooled as the merge, upsert and incremental steps read the spool again.
+SINGLE_PASS_LOAD = True
+# Rows per marshal batch in the spool and bytes the spools may hold in memory before spilling to disk.
+# zips_to_gdb shares the limit between the spools of the tables in flight, see load_planned_tables
+SPOOL_BATCH_SIZE = 5000
+SPOOL_MEMORY_LIMIT = 64 * 1024 * 1024
+# Write rows in chunks of NumPy structured arrays instead of one insertRow call per row.
+# Tables with a field type missing from BULK_FIELD_TYPES fall back to the insert cursor.
+# arcpy can't append an array to an existing table, so each chunk is written to an in_memory table and
+# appended to the output: every row is written twice, which only pays off against a slow insert cursor.
+BULK_INSERT = False
+BULK_CHUNK_SIZE = 50000
+# {<FieldType> : <NumPy dtype>}, "U" is sized to the longest value in each chunk.
+# Empty Date and Double values are written as NaT/NaN, Short and Long columns with empty values in a chunk
+# are staged as "<f8" with NaN so the append stores them as NULL.
+BULK_FIELD_TYPES = {
+    "Text" : "U",
+    "Date" : "<M8[us]",
+    "Short" : "<i2",
+    "Long" : "<i4",
+    "Double" : "<f8"
+}
+# x/y fields used to build the point geometry of a bulk chunk, they are not kept in the output
+BULK_SHAPE_FIELDS = ["BULK_SHAPE_X", "BULK_SHAPE_Y"]
+# Create each table in the output gdb and insert into it directly instead of staging it in
+# in_memory and copying/appending it. Peak memory is then bounded by the spool/chunk size.
+DIRECT_WRITE = True
+# Number of worker processes used to load the tables of a zip in parallel, 1 loads them one after another.
+# Each worker loads into its own scratch gdb and the tables are then merged into the output gdb.
+# Only used when READ_TABLES_FROM_ZIP is True.
+WORKERS = 1
+# With WORKERS > 1, tables of at least SPLIT_TABLE_SIZE bytes (uncompressed) are memory-mapped and split
+# into record ranges of about SPLIT_RANGE_SIZE bytes that the workers parse and load, the ranges are
+# then merged into one output table in their original order.
+SPLIT_TABLE_SIZE = 512 * 1024 * 1024
+SPLIT_RANGE_SIZE = 64 * 1024 * 1024
+# Create Short/Long/Double fields for columns where every value is a number. When False the legacy
+# schema is used where every field is Text unless its first value is a date.
+# Key fields used by RELATIONSHIPS and TABLES_WITH_ATTACHMENTS always stay Text so related keys match,
+# as do the fields matching DISCOVERY_KEY_PATTERN when RELATIONSHIP_DISCOVERY is used.
+INFER_NUMERIC_TYPES = True
+# Characters a numeric value can contain, anything else makes the column Text
+NUMERIC_CHARACTERS = "0123456789+-.eE"
+# Supported date formats, values that can't match DATE_PATTERN are rejected without calling strptime.
+# Parsed values are kept in an LRU cache of DATE_CACHE_SIZE entries shared by inference and loading.
+DATE_FORMATS = ["%m/%d/%y", "%m/%d/%Y"]
+DATE_PATTERN = re.compile(r"\d{1,2}/ ?\d{1,2}/\d{2}(?:\d{2})?$")
+DATE_CACHE_SIZE = 4096
+# How text field lengths are declared from the longest value seen in each column:
+#  "headroom" - the longest value plus LENGTH_HEADROOM, rounded up to LENGTH_ROUNDING, at least LENGTH_MINIMUM
+#  "legacy"   - at least 1000, longer values rounded up to the nearest thousand
+# Rows appended to an existing table (MERGE_ZIPS False, WORKERS > 1 or every INCREMENTAL_UPDATE night) can be
+# longer than the field was declared for. The field is then widened by copying its values into a new field, so
+# "headroom" trades smaller tables for an occasional field rebuild that the legacy lengths almost never need.
+LENGTH_POLICY = "headroom"
+LENGTH_HEADROOM = 0.25
+LENGTH_ROUNDING = 10
+LENGTH_MINIMUM = 50
+# List every text field in the declared/observed width report instead of only the table totals
+LENGTH_REPORT_FIELDS = False
+# Keep the inferred schema of each table in a JSON registry keyed by table name and a hash of the header row.
+# On a hit the validated field names, date and numeric types are reused and only widened by tonight's values.
+SCHEMA_REGISTRY = True
+SCHEMA_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CameoSchemaRegistry.json")
+# When several zips are imported, read every zip before writing so each table is created once with the
+# union of its columns and the rows of all the zips are inserted together, instead of appending zip by zip.
+# The tables are always spooled and WORKERS is not used. Only used when READ_TABLES_FROM_ZIP is True.
+MERGE_ZIPS = True
+# With WORKERS = 1 or MERGE_ZIPS the tables are decompressed and parsed on PARSE_THREADS threads, up to
+# PARSE_AHEAD tables ahead of the table being written. The tables are still written in a fixed order
+# (table name, then zip order) so the output doesn't depend on which thread finishes first.
+PARSE_THREADS = 2
+PARSE_AHEAD = 1
+# Keep one row per primary key, the parent key field of the table in RELATIONSHIPS, when a table is read
+# from several zips. The row with the newest value in the field ending with DATE_MODIFIED_SUFFIX wins and
+# ties go to the later zip. Only used by zips_to_gdb, rows already in an existing output table aren't checked.
+UPSERT_RECORDS = False
+DATE_MODIFIED_SUFFIX = "DateModified"
+# Update an existing output gdb instead of creating a new one. For tables with a primary key a content hash
+# of every record is kept in RECORD_HASH_TABLE, only new and changed records are written and records missing
+# from the export are deleted, duplicate keys are resolved like UPSERT_RECORDS. Tables without a key are
+# replaced. Attachments are only added to new and changed records and existing relationship classes are kept.
+# The fields are widened for tonight's values before any record is deleted, then the deletes and inserts of
+# each table run in one edit session that is rolled back if the table fails to load.
+# Requires READ_TABLES_FROM_ZIP, several zips are always merged.
+INCREMENTAL_UPDATE = False
+RECORD_HASH_TABLE = "CameoRecordHashes"
+# Find attachment files with the same content, files that share their size are hashed on ATTACHMENT_HASH_THREADS threads
+#  None     - attachments are not compared
+#  "report" - the duplicate files and bytes are reported, every file is still attached
+#  "link"   - each file content is attached once, the other records that have it get a row in ATTACHMENT_LINK_TABLE
+#             with the attachment table and ATTACHMENTID of the stored copy
+ATTACHMENT_DEDUP = "report"
+ATTACHMENT_HASH_THREADS = 4
+ATTACHMENT_LINK_TABLE = "CameoAttachmentLinks"
+# Write the attachments straight from the zip into the <table>__ATTACH tables with an insert cursor instead of
+# extracting SitePlansTemp and running AddAttachments. Only used when READ_TABLES_FROM_ZIP is True.
+ATTACHMENTS_FROM_ZIP = True
+# Keep the attachments read from the zips in a local content addressed cache shared by every run. Members whose
+# name, CRC-32, size and compressed size match a cached file are read from the cache instead of being decompressed
+# and hashed again. The least recently used files are removed once the cache holds more than ATTACHMENT_CACHE_SIZE
+# bytes. The cache keeps a second copy of the attachments, so it is off by default; set a folder outside the
+# toolbox to use it, e.g. os.path.join(tempfile.gettempdir(), "CameoAttachmentCache").
+# Only used with ATTACHMENTS_FROM_ZIP, None disables the cache.
+ATTACHMENT_CACHE_PATH = None
+ATTACHMENT_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+# Check that the child keys of RELATIONSHIPS resolve to a parent record once the tables are loaded and report
+# the orphans. When INTEGRITY_REPORT_TABLE is set each orphan key is also written to that table with its count,
+# e.g. "IntegrityReport" (file gdb table names can't start with an underscore).
+INTEGRITY_CHECK = True
+INTEGRITY_REPORT_TABLE = None
+# Add attribute indexes to the key fields of RELATIONSHIPS and TABLES_WITH_ATTACHMENTS once the tables are loaded
+# so related records are found without a full table scan, fields that are already indexed are skipped.
+CREATE_INDEXES = True
+# {<TableName> : [<FieldName>]} other fields to index, e.g. fields used in definition queries
+INDEX_FILTER_FIELDS = {
+    "Facilities" : ["FCounty", "FCity"]
+}
+# Build the spatial index of the point feature classes once they are loaded instead of maintaining the default index
+# while the rows are inserted. The grid size is chosen from the extent and number of the points so a grid cell
+# holds about SPATIAL_INDEX_POINTS_PER_CELL points, points loaded at 0,0 for invalid coordinates are left out.
+TUNE_SPATIAL_INDEX = True
+SPATIAL_INDEX_POINTS_PER_CELL = 16
+# Look for relationships missing from RELATIONSHIPS once the tables are loaded. A bottom-k MinHash sketch of the
+# distinct values of every key field (names matching DISCOVERY_KEY_PATTERN) is used to estimate how much of each
+# child key is contained in a unique key of another table, pairs above DISCOVERY_CONTAINMENT are proposed.
+#   None      - no discovery
+#   "suggest" - the proposals are reported and written to RELATIONSHIP_SUGGESTIONS_PATH in the RELATIONSHIPS format
+#   "create"  - the proposals are also created as relationship classes
+RELATIONSHIP_DISCOVERY = "suggest"
+RELATIONSHIP_SUGGESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CameoSuggestedRelationships.json")
+DISCOVERY_KEY_PATTERN = re.compile(r"(RecordID|RecID|RecordKey)$", re.IGNORECASE)
+DISCOVERY_CONTAINMENT = 0.9
+# number of hashes kept per field, the estimates are exact for fields with fewer distinct values
+DISCOVERY_SKETCH_SIZE = 256
+
 # THIS NEEDS TO BE UPDATED IF ADDITIONAL RELATIONSHIPS EXIST
 #{ <ParentTableName> : [
     #{ <ParentTableName> : <ParentKeyFieldName> }, 
@@ -112,34 +262,413 @@ RELATIONSHIPS = {
             { "SitePlanLink" : "FacilityRecordID" }
         ]}
 
-def extract_zip(path_to_zip):
-    """Extracts the zip to its parent folder"""
+def check_integrity(relationships, out_gdb_path):
+    """Counts the child records whose key doesn't match a record of any of its parent tables"""
+    """Each parent key is read into a set and each child table is read once for all of its keys"""
+    try:
+        arcpy.AddMessage("Checking referential integrity...")
+        #{(<ChildTableName>, <ChildFieldName>) : [(<ParentTableName>, <ParentKeyFieldName>)]}
+        # a child key can point at several parent tables, e.g. ContactsLink.OtherRecordID
+        child_keys = {}
+        for parent_table, table_maps in relationships.items():
+            parent_key = table_maps[0].get(parent_table)
+            for table_map in table_maps[1:]:
+                for child_table, child_field in table_map.items():
+                    child_keys.setdefault((child_table, child_field), []).append((parent_table, parent_key))
+
+        parent_values = {}
+        for parents in child_keys.values():
+            for parent in parents:
+                if parent not in parent_values:
+                    parent_values[parent] = read_key_values(out_gdb_path, parent[0], [parent[1]])
+        orphans = []
+        for child_table in sorted(set(child_table for child_table, child_field in child_keys)):
+            #[(<ChildFieldName>, [<ParentTableName>], [<ParentKeySet>])] for the parents that were loaded
+            checks = []
+            for child_field in sorted(child_field for table, child_field in child_keys if table == child_table):
+                parents = [parent for parent in child_keys[(child_table, child_field)] if parent_values[parent] is not None]
+                if len(parents) > 0:
+                    checks.append((child_field, [parent[0] for parent in parents], [parent_values[parent] for parent in parents]))
+            if len(checks) == 0:
+                continue
+            child_table_path = out_gdb_path + os.sep + child_table
+            if read_key_values(out_gdb_path, child_table, [check[0] for check in checks], check_only=True) is None:
+                continue
+            record_count = 0
+            empty_counts = [0] * len(checks)
+            orphan_counts = [{} for check in checks]
+            with arcpy.da.SearchCursor(child_table_path, [check[0] for check in checks]) as cursor:
+                for row in cursor:
+                    record_count += 1
+                    for index, value in enumerate(row):
+                        if value is None or value == "":
+                            empty_counts[index] += 1
+                        elif not any(value in key_set for key_set in checks[index][2]):
+                            orphan_counts[index][value] = orphan_counts[index].get(value, 0) + 1
+            for (child_field, parent_names, key_sets), empty, counts in zip(checks, empty_counts, orphan_counts):
+                parent_names = ", ".join(parent_names)
+                message = "  {0}.{1} -> {2}: {3} records, {4} empty, {5} orphans ({6} keys)".format(
+                    child_table, child_field, parent_names, record_count, empty, sum(counts.values()), len(counts))
+                if len(counts) > 0:
+                    arcpy.AddWarning(message)
+                else:
+                    arcpy.AddMessage(message)
+                orphans.extend((child_table, child_field, parent_names, value, count) for value, count in sorted(counts.items()))
+
+        if INTEGRITY_REPORT_TABLE is not None:
+            write_integrity_report(orphans, out_gdb_path)
+        arcpy.AddMessage("-"*50)
+    except Exception:
+        arcpy.AddError("Error occurred while checking referential integrity")
+        raise
+
+def read_key_values(out_gdb_path, table_name, field_names, check_only=False):
+    """Returns the set of values of the first field of the table, only the fields are checked when check_only is True"""
+    """None is returned when the table or one of the fields doesn't exist"""
+    table = out_gdb_path + os.sep + table_name
+    if not arcpy.Exists(table):
+        return None
+    table_fields = list_table_fields(table)
+    if any(field_name.lower() not in table_fields for field_name in field_names):
+        arcpy.AddWarning("  {0} doesn't have the field(s): {1}".format(table_name, ", ".join(field_names)))
+        return None
+    if check_only:
+        return field_names
+    with arcpy.da.SearchCursor(table, field_names) as cursor:
+        return set(row[0] for row in cursor)
+
+def write_integrity_report(orphans, out_gdb_path):
+    """Writes the (ChildTable, ChildField, ParentTables, OrphanKey, RecordCount) orphan rows to INTEGRITY_REPORT_TABLE"""
+    report_name = arcpy.ValidateTableName(INTEGRITY_REPORT_TABLE, out_gdb_path)
+    report_table = out_gdb_path + os.sep + report_name
+    if arcpy.Exists(report_table):
+        arcpy.Delete_management(report_table)
+    arcpy.CreateTable_management(out_gdb_path, report_name)
+    arcpy.AddField_management(report_table, "ChildTable", "TEXT", field_length=64)
+    arcpy.AddField_management(report_table, "ChildField", "TEXT", field_length=64)
+    arcpy.AddField_management(report_table, "ParentTables", "TEXT", field_length=255)
+    arcpy.AddField_management(report_table, "OrphanKey", "TEXT", field_length=255)
+    arcpy.AddField_management(report_table, "RecordCount", "LONG")
+    with arcpy.da.InsertCursor(report_table, ["ChildTable", "ChildField", "ParentTables", "OrphanKey", "RecordCount"]) as cursor:
+        for orphan in orphans:
+            cursor.insertRow(orphan)
+    arcpy.AddMessage("  {0} orphan keys written to {1}".format(len(orphans), report_name))
+
+def create_indexes(out_gdb_path):
+    """Adds attribute indexes to the relationship and attachment keys and the INDEX_FILTER_FIELDS"""
+    try:
+        arcpy.AddMessage("Creating attribute indexes...")
+        #{<TableName> : [<FieldName>]}
+        index_fields = {}
+        for table_maps in RELATIONSHIPS.values():
+            for table_map in table_maps:
+                for table_name, field_name in table_map.items():
+                    index_fields.setdefault(table_name, []).append(field_name)
+        for table_name, field_name in TABLES_WITH_ATTACHMENTS.items():
+            index_fields.setdefault(table_name, []).append(field_name)
+        for table_name, field_names in INDEX_FILTER_FIELDS.items():
+            index_fields.setdefault(table_name, []).extend(field_names)
+
+        for table_name in sorted(index_fields):
+            table = out_gdb_path + os.sep + table_name
+            if not arcpy.Exists(table):
+                continue
+            table_fields = list_table_fields(table)
+            indexed_fields = set(index.fields[0].name.lower() for index in arcpy.ListIndexes(table) if len(index.fields) == 1)
+            for field_name in list(dict.fromkeys(index_fields[table_name])):
+                if field_name.lower() not in table_fields or field_name.lower() in indexed_fields:
+                    continue
+                start = time.perf_counter()
+                arcpy.AddIndex_management(table, field_name, "IX_" + field_name, "NON_UNIQUE", "ASCENDING")
+                indexed_fields.add(field_name.lower())
+                arcpy.AddMessage("  {0}.{1}: {2:.2f}s".format(table_name, field_name, time.perf_counter() - start))
+        arcpy.AddMessage("-"*50)
+    except Exception:
+        arcpy.AddError("Error occurred while creating attribute indexes")
+        raise
+
+def tune_spatial_indexes(out_gdb_path):
+    """Rebuilds the spatial index of each point feature class with a grid size for its points"""
+    try:
+        arcpy.AddMessage("Building spatial indexes...")
+        for table_name in sorted(NAMES_OF_SPATIAL_TABLES):
+            feature_class = out_gdb_path + os.sep + table_name
+            if not arcpy.Exists(feature_class):
+                continue
+            start = time.perf_counter()
+            grid_size, point_count = get_spatial_grid_size(feature_class)
+            build_spatial_index(feature_class, grid_size)
+            arcpy.AddMessage("  {0}: {1} points, grid size {2:g}, {3:.2f}s".format(table_name, point_count, grid_size, time.perf_counter() - start))
+        arcpy.AddMessage("-"*50)
+    except Exception:
+        arcpy.AddError("Error occurred while building spatial indexes")
+        raise
+
+def get_spatial_grid_size(feature_class):
+    """Returns the spatial index grid size for the points of the feature class and the number of points"""
+    """A grid size of 0 lets the geodatabase choose, it's used when the points don't cover an area"""
+    point_count = 0
+    x_min, y_min, x_max, y_max = float("inf"), float("inf"), float("-inf"), float("-inf")
+    with arcpy.da.SearchCursor(feature_class, ["SHAPE@XY"]) as cursor:
+        for xy, in cursor:
+            #rows with invalid coordinates are loaded at 0,0
+            if xy is None or xy == (0.0, 0.0):
+                continue
+            x, y = xy
+            point_count += 1
+            x_min, x_max = min(x_min, x), max(x_max, x)
+            y_min, y_max = min(y_min, y), max(y_max, y)
+    if point_count < 2:
+        return 0, point_count
+    #a line of points is treated as a square of its length
+    width, height = x_max - x_min, y_max - y_min
+    area = width * height if width > 0 and height > 0 else max(width, height) ** 2
+    if area == 0:
+        return 0, point_count
+    return math.sqrt(area * SPATIAL_INDEX_POINTS_PER_CELL / point_count), point_count
+
+def build_spatial_index(feature_class, grid_size):
+    """Replaces the spatial index of the feature class with one of the given grid size"""
+    if arcpy.Describe(feature_class).hasSpatialIndex:
+        arcpy.RemoveSpatialIndex_management(feature_class)
+    arcpy.AddSpatialIndex_management(feature_class, grid_size)
+
+def discover_relationships(relationships, out_gdb_path):
+    """Returns the (ParentTable, ParentKey, ChildTable, ChildKey, Cardinality) relationships found from the key
+    field sketches that aren't in relationships, and writes them to RELATIONSHIP_SUGGESTIONS_PATH"""
+    try:
+        arcpy.AddMessage("Discovering relationships...")
+        known_keys = set((child_table.lower(), child_field.lower()) for table_maps in relationships.values()
+                         for table_map in table_maps[1:] for child_table, child_field in table_map.items())
+        #{(<TableName>, <FieldName>) : (<RecordCount>, <Sketch>, <Unique>)}
+        sketches = {}
+        #{(<TableName>, <FieldName>) : <FieldType>}
+        field_types = {}
+        for table_name in sorted(arcpy.ListTables() + arcpy.ListFeatureClasses()):
+            if "__ATTACH" in table_name or table_name in [RECORD_HASH_TABLE, ATTACHMENT_LINK_TABLE, INTEGRITY_REPORT_TABLE]:
+                continue
+            key_fields = [field for field in arcpy.ListFields(out_gdb_path + os.sep + table_name)
+                          if field.type != "OID" and DISCOVERY_KEY_PATTERN.search(field.name)]
+            if len(key_fields) > 0:
+                field_names = [field.name for field in key_fields]
+                for field, sketch in zip(key_fields, read_key_sketches(out_gdb_path + os.sep + table_name, field_names)):
+                    sketches[(table_name, field.name)] = sketch
+                    field_types[(table_name, field.name)] = field.type
+        parents = [(key, sketch) for key, sketch in sketches.items() if sketch[0] > 0 and sketch[2]]
+        #{(<TableName>, <FieldName>) : <HashSet>} of the parent keys that were read in full
+        parent_hashes = {}
+
+        proposals = []
+        for (child_table, child_field), (child_count, child_sketch, child_unique) in sorted(sketches.items()):
+            if child_count == 0 or (child_table.lower(), child_field.lower()) in known_keys:
+                continue
+            candidates = []
+            for (parent_table, parent_field), (parent_count, parent_sketch, parent_unique) in parents:
+                #a relationship class needs keys of the same type
+                if parent_table == child_table or field_types[(parent_table, parent_field)] != field_types[(child_table, child_field)]:
+                    continue
+                containment = estimate_containment(child_sketch, parent_sketch)
+                if containment is None:
+                    #too few child hashes fall in the range of the parent sketch, compare them with every parent value
+                    if (parent_table, parent_field) not in parent_hashes:
+                        parent_hashes[(parent_table, parent_field)] = read_key_hashes(out_gdb_path + os.sep + parent_table, parent_field)
+                    containment = estimate_containment(child_sketch, parent_hashes[(parent_table, parent_field)])
+                if containment < DISCOVERY_CONTAINMENT:
+                    continue
+                #two unique keys holding the same values are one relationship, the table with more keys is the parent
+                parent_distinct, child_distinct = estimate_distinct(parent_sketch), estimate_distinct(child_sketch)
+                if child_unique and (estimate_containment(parent_sketch, child_sketch) or 0.0) >= DISCOVERY_CONTAINMENT and \
+                        (child_distinct, parent_table) > (parent_distinct, child_table):
+                    continue
+                candidates.append((-containment, parent_distinct, parent_table, parent_field))
+            if len(candidates) == 0:
+                continue
+            #the best contained, most specific parent key
+            containment, parent_distinct, parent_table, parent_field = min(candidates)
+            cardinality = "ONE_TO_ONE" if child_unique else "ONE_TO_MANY"
+            proposals.append((parent_table, parent_field, child_table, child_field, cardinality))
+            arcpy.AddMessage("  {0}.{1} -> {2}.{3}: {4}, {5:.0%} contained".format(
+                child_table, child_field, parent_table, parent_field, cardinality, -containment))
+        if len(proposals) == 0:
+            arcpy.AddMessage("  no relationships found that aren't in RELATIONSHIPS")
+        else:
+            write_relationship_suggestions(proposals)
+        arcpy.AddMessage("-"*50)
+        return proposals
+    except Exception:
+        arcpy.AddError("Error occurred while discovering relationships")
+        raise
+
+def read_key_sketches(table, field_names):
+    """Returns a (RecordCount, Sketch, Unique) tuple for each field of the table, see sketch_key_values"""
+    with arcpy.da.SearchCursor(table, field_names) as cursor:
+        return sketch_key_values(cursor, len(field_names))
+
+def sketch_key_values(rows, field_count):
+    """Returns a (RecordCount, Sketch, Unique) tuple for each of the field_count values of the rows, empty values
+    aren't counted"""
+    """A sketch is the sorted DISCOVERY_SKETCH_SIZE smallest 64 bit hashes of the distinct values of the field,
+    the field is taken as unique when none of the sketched values repeat"""
+    counts = [0] * field_count
+    #a max heap of the negated hashes and the number of times each hash it holds was read
+    heaps = [([], {}) for index in range(field_count)]
+    for row in rows:
+        for index, value in enumerate(row):
+            if value is None or value == "":
+                continue
+            counts[index] += 1
+            heap, members = heaps[index]
+            value_hash = hash_key_value(value)
+            if value_hash in members:
+                members[value_hash] += 1
+            elif len(heap) < DISCOVERY_SKETCH_SIZE:
+                heapq.heappush(heap, -value_hash)
+                members[value_hash] = 1
+            elif value_hash < -heap[0]:
+                del members[-heapq.heapreplace(heap, -value_hash)]
+                members[value_hash] = 1
+    return [(count, sorted(members), all(repeats == 1 for repeats in members.values()))
+            for count, (heap, members) in zip(counts, heaps)]
+
+def read_key_hashes(table, field_name):
+    """Returns the set of the hashes of every value of the field"""
+    with arcpy.da.SearchCursor(table, [field_name]) as cursor:
+        return set(hash_key_value(row[0]) for row in cursor if row[0] is not None and row[0] != "")
+
+def hash_key_value(value):
+    """Returns the 64 bit hash of a key value used in the sketches"""
+    return int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "little")
+
+def estimate_distinct(sketch):
+    """Returns the estimated number of distinct values from the sketch"""
+    if len(sketch) < DISCOVERY_SKETCH_SIZE:
+        return len(sketch)
+    return (DISCOVERY_SKETCH_SIZE - 1) * 2.0 ** 64 / (sketch[-1] + 1)
+
+def estimate_containment(child_sketch, parent_sketch):
+    """Returns the estimated share of the distinct child values that are also parent values, None when too few
+    child hashes are in the range of the parent sketch for an estimate"""
+    """The child sketch holds every child value or a uniform sample of them, so the share of its hashes found in
+    the parent is the estimate. parent_sketch can also be the set of every parent hash, which makes it exact"""
+    if len(parent_sketch) < DISCOVERY_SKETCH_SIZE or isinstance(parent_sketch, set):
+        sample = child_sketch
+    else:
+        #every parent value hashed at or below the last hash of its sketch is in the sketch
+        sample = [value_hash for value_hash in child_sketch if value_hash <= parent_sketch[-1]]
+    #a part of the child sketch smaller than 32 hashes is too small a sample
+    if len(sample) == 0 or (len(sample) < len(child_sketch) and len(sample) < 32):
+        return None
+    parent_set = set(parent_sketch)
+    return sum(1 for value_hash in sample if value_hash in parent_set) / float(len(sample))
+
+def write_relationship_suggestions(proposals):
+    """Writes the proposed relationships to RELATIONSHIP_SUGGESTIONS_PATH in the RELATIONSHIPS format"""
+    suggestions = {}
+    for parent_table, parent_field, child_table, child_field, cardinality in proposals:
+        table_maps = suggestions.setdefault(parent_table, [{ parent_table : parent_field }])
+        #RELATIONSHIPS holds one key per parent table
+        if table_maps[0][parent_table] != parent_field:
+            arcpy.AddWarning("  {0}.{1} -> {2}.{3} left out of the suggestions, {2} is keyed on {4}".format(
+                child_table, child_field, parent_table, parent_field, table_maps[0][parent_table]))
+            continue
+        table_maps.append({ child_table : child_field })
     try:
-        arcpy.AddMessage("Extracting zip...")
-        folder_path = os.path.dirname(path_to_zip)
-        sub_folder_path = ""
-        zip_file = zipfile.ZipFile(path_to_zip, 'r')
-        for file in zip_file.namelist():
+        suggestions_folder = os.path.dirname(RELATIONSHIP_SUGGESTIONS_PATH)
+        with tempfile.NamedTemporaryFile('w', dir=suggestions_folder, suffix=".json", delete=False) as suggestions_file:
+            json.dump(suggestions, suggestions_file, indent=1, sort_keys=True)
+        os.replace(suggestions_file.name, RELATIONSHIP_SUGGESTIONS_PATH)
+        arcpy.AddMessage("  {0} suggested relationships written to {1}".format(len(proposals), RELATIONSHIP_SUGGESTIONS_PATH))
+    except (IOError, OSError):
+        arcpy.AddWarning("  Unable to write the suggested relationships: " + RELATIONSHIP_SUGGESTIONS_PATH)
+
+def extract_zip_members(path_to_zip, folder_path, attachments_only=False):
+    """Extracts the zip to the folder and returns the folder that holds the tables, doesn't use arcpy"""
+    sub_folder_path = ""
+    with zipfile.ZipFile(path_to_zip, 'r') as zip_file:
+        members = zip_file.namelist()
+        if attachments_only:
+            root = get_zip_table_root(zip_file)
+            sub_folder_path = os.path.join(folder_path, *root.split("/")) if root != "" else folder_path
+            members = [file for file in members if file.startswith(root + ATTACHMENT_DIR_NAME + "/")]
+        for file in members:
             if sub_folder_path == "":
                 sub_path =  file.split("/")
                 if len(sub_path) > 0:
                     sub_folder_path += folder_path + os.sep + os.sep.join(sub_path[:-1])
             zip_file.extract(file, folder_path)
-        zip_file.close()
-        arcpy.AddMessage("  zip extracted")
-        arcpy.AddMessage("-"*50)
-        if sub_folder_path != "":
-            return sub_folder_path
-        else:
-            return folder_path
-    except Exception:
-        arcpy.AddError("Error occurred while extracting zip file")
-        raise
+    if sub_folder_path != "":
+        return sub_folder_path
+    else:
+        return folder_path
+
+def create_extract_folder(path_to_zip):
+    """Returns a new folder next to the zip that only this zip is extracted to"""
+    #zips in the same folder would otherwise overwrite each other's tables and attachments
+    zip_name = os.path.splitext(os.path.basename(path_to_zip))[0]
+    return tempfile.mkdtemp(prefix=zip_name + "_", dir=os.path.dirname(path_to_zip))
+
+def prefetch_extractions(zip_paths, attachments_only=False, extract=True):
+    """Yields (zip path, extracted location) in zip order, each zip is extracted to its own folder"""
+    """The next zip is extracted on a thread while the current one is processed, its folder is removed afterwards"""
+    if not extract:
+        for zip_path in zip_paths:
+            yield zip_path, None
+        return
+    folders = []
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            def submit(zip_path):
+                folders.append(create_extract_folder(zip_path))
+                return executor.submit(extract_zip_members, zip_path, folders[-1], attachments_only)
+            next_extraction = submit(zip_paths[0]) if len(zip_paths) > 0 else None
+            for position, zip_path in enumerate(zip_paths):
+                extraction = next_extraction
+                if position + 1 < len(zip_paths):
+                    next_extraction = submit(zip_paths[position + 1])
+                try:
+                    arcpy.AddMessage("Extracting zip...")
+                    extracted_file_location = extraction.result()
+                    arcpy.AddMessage("  zip extracted")
+                    arcpy.AddMessage("-"*50)
+                except Exception:
+                    arcpy.AddError("Error occurred while extracting zip file")
+                    raise
+                yield zip_path, extracted_file_location
+                shutil.rmtree(folders[position], ignore_errors=True)
+    finally:
+        for folder in folders:
+            shutil.rmtree(folder, ignore_errors=True)
+
+def list_zip_tables(zip_file):
+    """Returns the .mer members of the zip as (table name, ZipInfo) pairs sorted by table name"""
+    tables = []
+    for info in zip_file.infolist():
+        path_parts = info.filename.split("/")
+        if path_parts[-1].lower().endswith(".mer") and ATTACHMENT_DIR_NAME not in path_parts:
+            tables.append((os.path.splitext(path_parts[-1])[0], info))
+    return sorted(tables, key=lambda table: table[0].lower())
+
+def get_zip_table_root(zip_file):
+    """Returns the folder inside the zip ("" or "<folder>/") that holds the .mer files"""
+    tables = list_zip_tables(zip_file)
+    if len(tables) > 0:
+        root = posixpath.dirname(tables[0][1].filename)
+        return root + "/" if root != "" else ""
+    return ""
+
+def open_zip_member(zip_file, member):
+    """Opens a member of the zip as a text stream for the csv reader"""
+    return io.TextIOWrapper(zip_file.open(member, 'r'), encoding=locale.getpreferredencoding(False))
 
 def create_output_gdb(parent_folder, gdb_name):
     """Creates a new gdb for the results"""
     arcpy.AddMessage("Checking output workspace...")
     gdb_path = parent_folder + os.sep + gdb_name + ".gdb"
+    if INCREMENTAL_UPDATE and arcpy.Exists(gdb_path):
+        arcpy.AddMessage("Updating GDB: " + gdb_path)
+        arcpy.env.workspace = str(gdb_path)
+        arcpy.AddMessage("-"*50)
+        return str(gdb_path)
     #generate a unique name if the gdb already exists
     if arcpy.Exists(gdb_path):
         arcpy.AddWarning("    " + gdb_path + " already exists...creating a unique name for the workspace")
@@ -151,18 +680,23 @@ def create_output_gdb(parent_folder, gdb_name):
     arcpy.AddMessage("-"*50)
     return str(gdb_path)
    
-def create_relationship_class(parent_table, primary_key, child_table, foreign_key):
+def create_relationship_class(parent_table, primary_key, child_table, foreign_key, catalog=None, cardinality="ONE_TO_MANY"):
     """creates the relationship class"""
+    """Tables, fields and existing relationship classes are resolved from the catalog of get_workspace_catalog"""
     try:
+        if catalog is None:
+            catalog = get_workspace_catalog(arcpy.env.workspace)
+        tables, relationship_classes = catalog
+
         # get parent table and check if exists
         parent_table_name = os.path.basename(parent_table)
         full_parent_table_path = arcpy.env.workspace + os.sep + parent_table
-        parent_exists = arcpy.Exists(full_parent_table_path)
+        parent_fields = tables.get(parent_table_name.lower())
 
         # get child table and check if exists
         child_table_name = os.path.basename(child_table)
         full_child_table_path = arcpy.env.workspace + os.sep + child_table
-        child_exists = arcpy.Exists(full_child_table_path)
+        child_fields = tables.get(child_table_name.lower())
         
         #name for rel class
         out_relationship_class_name = "{0}_{1}".format(parent_table_name, child_table_name)
@@ -170,35 +704,65 @@ def create_relationship_class(parent_table, primary_key, child_table, foreign_ke
         #populated if the given table does not exist
         return_issues = []
 
+        #an incremental update keeps the relationship classes of the existing gdb
+        if out_relationship_class_name.lower() in relationship_classes:
+            arcpy.AddMessage("  exists: " + out_relationship_class_name)
+            return return_issues
+
         #verify that both tables exist prior to creating the relationship class
-        if parent_exists and child_exists:
-            arcpy.CreateRelationshipClass_management(full_parent_table_path, 
-                                                     full_child_table_path, 
-                                                     out_relationship_class_name,
-                                                     "SIMPLE",
-                                                     child_table_name,
-                                                     "Parent",
-                                                     "FORWARD",
-                                                     "ONE_TO_MANY",
-                                                     "NONE",
-                                                     primary_key,
-                                                     foreign_key)
-            arcpy.AddMessage("  created: " + out_relationship_class_name)
-        else:
-            
-            if not parent_exists:
+        if parent_fields is None or child_fields is None:
+            if parent_fields is None:
                 return_issues.append(full_parent_table_path)
-            if not child_exists:
+            if child_fields is None:
                 return_issues.append(full_child_table_path)
+            return return_issues
+
+        #skip pairs with a missing key field rather than failing in CreateRelationshipClass
+        missing_fields = [table_name + "." + field_name for table_name, field_name, fields in
+                          [(parent_table_name, primary_key, parent_fields), (child_table_name, foreign_key, child_fields)]
+                          if field_name.lower() not in fields]
+        if len(missing_fields) > 0:
+            arcpy.AddWarning("  skipped: {0} (missing field(s): {1})".format(out_relationship_class_name, ", ".join(missing_fields)))
+            return missing_fields
+
+        arcpy.CreateRelationshipClass_management(full_parent_table_path, 
+                                                 full_child_table_path, 
+                                                 out_relationship_class_name,
+                                                 "SIMPLE",
+                                                 child_table_name,
+                                                 "Parent",
+                                                 "FORWARD",
+                                                 cardinality,
+                                                 "NONE",
+                                                 primary_key,
+                                                 foreign_key)
+        relationship_classes.add(out_relationship_class_name.lower())
+        arcpy.AddMessage("  created: " + out_relationship_class_name)
         return return_issues
     except arcpy.ExecuteError:
         arcpy.AddError("Error creating relationship between {0} and {1}".format(parent_table, child_table))
         raise
 
-def create_relationship_classes(relationships):
+def get_workspace_catalog(workspace):
+    """Returns the tables and feature classes of the workspace with their lower case field names, and the set of its
+    relationship class names, all keyed by lower case name"""
+    """The workspace is walked once instead of calling arcpy.Exists for every relationship pair"""
+    tables = {}
+    for dirpath, dirnames, filenames in arcpy.da.Walk(workspace, datatype=["Table", "FeatureClass"]):
+        for filename in filenames:
+            tables[filename.lower()] = set(list_table_fields(os.path.join(dirpath, filename)))
+    relationship_classes = set()
+    for dirpath, dirnames, filenames in arcpy.da.Walk(workspace, datatype="RelationshipClass"):
+        relationship_classes.update(filename.lower() for filename in filenames)
+    return tables, relationship_classes
+
+def create_relationship_classes(relationships, discovered=()):
     """Loop through the RELATIONSHIPS dictionary and create the relationship classes"""
+    """discovered holds the (ParentTable, ParentKey, ChildTable, ChildKey, Cardinality) relationships from
+    discover_relationships to create as well"""
     arcpy.AddMessage("Creating relationship classes...")
     rel_issues = []
+    catalog = get_workspace_catalog(arcpy.env.workspace)
     for main_table in list(relationships.keys()):
         parent_table = ""
         parent_table_field_name = ""
@@ -212,13 +776,21 @@ def create_relationship_classes(relationships):
                 rel_issue = create_relationship_class(parent_table, 
                                         parent_table_field_name, 
                                         child_table_name, 
-                                        child_table_field_name)
+                                        child_table_field_name,
+                                        catalog)
                 if len(rel_issue) > 0:
                     for issue in rel_issue:
                         rel_issues.append(issue)
             else:
                 parent_table = list(table_map.keys())[0]
                 parent_table_field_name = table_map[parent_table]
+    for parent_table, parent_table_field_name, child_table_name, child_table_field_name, cardinality in discovered:
+        rel_issues.extend(create_relationship_class(parent_table, 
+                                                    parent_table_field_name, 
+                                                    child_table_name, 
+                                                    child_table_field_name,
+                                                    catalog,
+                                                    cardinality))
     arcpy.AddMessage("Relationship classes created")
     #if len(rel_issues) > 0:
         #arcpy.AddWarning("Please review the RELATIONSHIPS variable in the source Python file to ensure it is valid")
@@ -227,20 +799,38 @@ def create_relationship_classes(relationships):
             #arcpy.AddWarning(issue)
     arcpy.AddMessage("-"*50)
 
-def add_attachments(extracted_file_location, out_gdb_path):
+def add_attachments(extracted_file_location, out_gdb_path, zip_file=None, cache=None):
     """Loop through attachment folders and add the attachments"""
+    """When zip_file is given the attachments are read from the zip instead of the extracted folder,
+    through the attachment cache from open_attachment_cache when one is given"""
     try:
-        attachment_full_path = extracted_file_location + os.sep + ATTACHMENT_DIR_NAME
         available_tables = arcpy.ListFeatureClasses() + arcpy.ListTables()
-        for table, idField in TABLES_WITH_ATTACHMENTS.items():
-            #Check to see if table is in the geodatabase, not all CAMEO ZIPs will have ALL of the possible TABLE_WITH_ATTACHMENTS
-            if table in available_tables:
-                arcpy.AddMessage("Adding attachments to {}...".format(table))
-                if os.path.exists(attachment_full_path):
-                    add_attachment(attachment_full_path, table, idField)
-                else:
+        #Check to see if table is in the geodatabase, not all CAMEO ZIPs will have ALL of the possible TABLE_WITH_ATTACHMENTS
+        tables = [(table, idField) for table, idField in TABLES_WITH_ATTACHMENTS.items() if table in available_tables]
+        if zip_file is not None:
+            attachment_index = index_zip_attachments(zip_file)
+        else:
+            attachment_full_path = extracted_file_location + os.sep + ATTACHMENT_DIR_NAME
+            if not os.path.exists(attachment_full_path):
+                for table, idField in tables:
+                    arcpy.AddMessage("Adding attachments to {}...".format(table))
                     arcpy.AddWarning("Expected attachment path does not exist: " + attachment_full_path)
-                arcpy.AddMessage(" attachments added")
+                return
+            #the attachment folder is scanned once and shared by every table
+            attachment_index = index_attachments(attachment_full_path)
+        table_matches = [(table, idField, match_attachments(attachment_index, table, idField)) for table, idField in tables]
+        duplicates = {}
+        if ATTACHMENT_DEDUP is not None:
+            duplicates = find_duplicate_attachments([file for table, idField, matches in table_matches
+                                                     for files in matches.values() for file in files], zip_file, cache)
+        for table, idField, matches in table_matches:
+            arcpy.AddMessage("Adding attachments to {}...".format(table))
+            if ATTACHMENT_DEDUP == "link":
+                matches = dict((record_id, [file for file in files if file not in duplicates]) for record_id, files in matches.items())
+            add_attachment(matches, table, idField, zip_file, cache)
+            arcpy.AddMessage(" attachments added")
+        if ATTACHMENT_DEDUP == "link" and len(duplicates) > 0:
+            link_duplicate_attachments(table_matches, duplicates, out_gdb_path)
     except Exception:
         arcpy.AddError("Error occurred while adding attachments")  
         raise    
@@ -253,17 +843,72 @@ def remove_attachment_folder(extracted_file_location, out_gdb_path):
         shutil.rmtree(attachment_full_path)
         arcpy.AddMessage("Removed attachment folder: {}\n".format(attachment_full_path))
 
-def add_attachment(search_folder, inTable, att_id_field):
+def index_attachments(parent_folder):
+    """Returns {<FolderName> : [<PathToFile>]} for the folders under parent_folder that hold files"""
+    """The folder name is the record id the files are attached to"""
+    attachment_index = {}
+    folders = [parent_folder]
+    while len(folders) > 0:
+        folder = folders.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    folders.append(entry.path)
+                else:
+                    attachment_index.setdefault(os.path.basename(folder), []).append(entry.path)
+    #sorted so the first copy of a duplicate file doesn't depend on the directory order
+    for files in attachment_index.values():
+        files.sort()
+    return attachment_index
+
+def index_zip_attachments(zip_file):
+    """Returns {<FolderName> : [<ZipInfo>]} for the attachment members of the zip, see index_attachments"""
+    attachment_root = get_zip_table_root(zip_file) + ATTACHMENT_DIR_NAME + "/"
+    attachment_index = {}
+    for info in zip_file.infolist():
+        if info.filename.startswith(attachment_root) and not info.filename.endswith("/"):
+            folder = posixpath.basename(posixpath.dirname(info.filename))
+            attachment_index.setdefault(folder, []).append(info)
+    for files in attachment_index.values():
+        files.sort(key=lambda info: info.filename)
+    return attachment_index
+
+def get_attachment_name(file):
+    """Returns the file name of an attachment path or zip member"""
+    if isinstance(file, zipfile.ZipInfo):
+        return posixpath.basename(file.filename)
+    return os.path.basename(file)
+
+def match_attachments(attachment_index, inTable, att_id_field):
+    """Returns the part of the attachment index for the records of the table"""
+    # an incremental update only adds attachments to the records that were written, unchanged records keep theirs
+    if INCREMENTAL_UPDATE and arcpy.Exists(arcpy.env.workspace + os.sep + inTable + "__ATTACH"):
+        record_ids = get_records_without_attachments(arcpy.env.workspace + os.sep + inTable, att_id_field)
+    else:
+        record_ids = get_record_ids(arcpy.env.workspace + os.sep + inTable, att_id_field)
+    return dict((record_id, files) for record_id, files in attachment_index.items() if record_id in record_ids)
+
+def add_attachment(matches, inTable, att_id_field, zip_file=None, cache=None):
     """Enable and add the attachments """
+    """matches is the {<RecordID> : [<PathToFile>]} part of the attachment index for the table"""
+    """or {<RecordID> : [<ZipInfo>]} when the attachments are read from zip_file"""
     #fields added to support the attachment table generated
     id_field_name = "fieldID"
     value_field_name = "fieldValue"
 
     #first enable attachments
-    arcpy.EnableAttachments_management(arcpy.env.workspace + os.sep + inTable)
+    if not arcpy.Exists(arcpy.env.workspace + os.sep + inTable + "__ATTACH"):
+        arcpy.EnableAttachments_management(arcpy.env.workspace + os.sep + inTable)
+
+    if sum(len(files) for files in matches.values()) == 0:
+        return
+
+    if zip_file is not None:
+        insert_zip_attachments(zip_file, matches, arcpy.env.workspace + os.sep + inTable, att_id_field, cache)
+        return
 
     #create attachemnt table (<FieldValueToJoinOn>, <pathToResource>)
-    attachment_table = create_attachment_table(search_folder, id_field_name, value_field_name)
+    attachment_table = create_attachment_table(matches, id_field_name, value_field_name)
 
     #TODO could look at using the working directory arg here to support longer paths to the attachments
     arcpy.AddAttachments_management(arcpy.env.workspace + os.sep + inTable, 
@@ -272,9 +917,233 @@ def add_attachment(search_folder, inTable, att_id_field):
                                     id_field_name, 
                                     value_field_name)
 
-def create_attachment_table(parent_folder, id_field_name, value_field_name):
+def insert_zip_attachments(zip_file, matches, in_table, att_id_field, cache=None):
+    """Writes the attachment members of the zip straight into the attachment table of in_table"""
+    attachment_table = in_table + "__ATTACH"
+    #the attachments are related by global id when the table has global ids
+    if "REL_GLOBALID" in [field.name.upper() for field in arcpy.ListFields(attachment_table)]:
+        relate_field, relate_token = "REL_GLOBALID", "GLOBALID@"
+    else:
+        relate_field, relate_token = "REL_OBJECTID", "OID@"
+    related_ids = {}
+    with arcpy.da.SearchCursor(in_table, [relate_token, att_id_field]) as cursor:
+        for row in cursor:
+            if row[1] in matches:
+                related_ids.setdefault(row[1], []).append(row[0])
+    with arcpy.da.InsertCursor(attachment_table, [relate_field, "CONTENT_TYPE", "ATT_NAME", "DATA_SIZE", "DATA"]) as cursor:
+        for record_id, members in matches.items():
+            for member in members:
+                data = read_attachment(zip_file, member, cache)
+                name = get_attachment_name(member)
+                content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                for related_id in related_ids.get(record_id, []):
+                    cursor.insertRow([related_id, content_type, name, len(data), data])
+
+def read_zip_member(zip_file, member, block_size=1024 * 1024):
+    """Returns the content of a member of the zip as a memoryview, read in blocks into one buffer"""
+    data = bytearray(member.file_size)
+    view = memoryview(data)
+    position = 0
+    with zip_file.open(member, 'r') as source:
+        while position < len(data):
+            read = source.readinto(view[position:position + block_size])
+            if read == 0:
+                break
+            position += read
+    return view[:position]
+
+def open_attachment_cache():
+    """Returns the attachment cache used for this run, None when there is no cache"""
+    """The cache is {"index" : {<CacheKey> : <SHA-256>}, "hits", "misses", "bytes_saved"}, see get_cache_key and read_attachment"""
+    if ATTACHMENT_CACHE_PATH is None:
+        return None
+    index = {}
+    try:
+        if not os.path.exists(ATTACHMENT_CACHE_PATH):
+            os.makedirs(ATTACHMENT_CACHE_PATH)
+        with open(os.path.join(ATTACHMENT_CACHE_PATH, "index.json"), 'r') as index_file:
+            index = json.load(index_file)
+    except (IOError, OSError, ValueError):
+        pass
+    return {"index" : index, "hits" : 0, "misses" : 0, "bytes_saved" : 0}
+
+def get_cache_key(member):
+    """Returns the attachment cache key of a zip member, known without decompressing it"""
+    """The CRC-32 alone can collide, so the sizes and the member name from the zip directory are part of the key"""
+    return "{0:08x}-{1}-{2}-{3}".format(member.CRC, member.file_size, member.compress_size, member.filename)
+
+def get_cache_path(blob_hash):
+    """Returns the path of a cached file"""
+    return os.path.join(ATTACHMENT_CACHE_PATH, blob_hash[:2], blob_hash)
+
+def read_attachment(zip_file, member, cache=None):
+    """Returns the content of an attachment member of the zip as a memoryview"""
+    """The cached copy is used when the cache holds a file with the same cache key, otherwise it's added"""
+    if cache is None:
+        return read_zip_member(zip_file, member)
+    key = get_cache_key(member)
+    if key in cache["index"]:
+        blob_path = get_cache_path(cache["index"][key])
+        try:
+            with open(blob_path, 'rb') as blob_file:
+                data = blob_file.read()
+            if len(data) == member.file_size:
+                #the modified time orders the files for eviction
+                os.utime(blob_path, None)
+                cache["hits"] += 1
+                cache["bytes_saved"] += member.file_size
+                return memoryview(data)
+        except (IOError, OSError):
+            pass
+    data = read_zip_member(zip_file, member)
+    cache["misses"] += 1
+    blob_hash = hashlib.sha256(data).hexdigest()
+    blob_path = get_cache_path(blob_hash)
+    try:
+        if not os.path.exists(blob_path):
+            if not os.path.exists(os.path.dirname(blob_path)):
+                os.makedirs(os.path.dirname(blob_path))
+            with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(blob_path), delete=False) as blob_file:
+                blob_file.write(data)
+            os.replace(blob_file.name, blob_path)
+        else:
+            os.utime(blob_path, None)
+        cache["index"][key] = blob_hash
+    except (IOError, OSError):
+        arcpy.AddWarning("  Unable to add {0} to the attachment cache".format(get_attachment_name(member)))
+    return data
+
+def close_attachment_cache(cache):
+    """Reports the cache hit rate, removes the least recently used files over ATTACHMENT_CACHE_SIZE and saves the index"""
+    if cache is None:
+        return
+    reads = cache["hits"] + cache["misses"]
+    if reads > 0:
+        arcpy.AddMessage("Attachment cache: {0} of {1} attachments read from the cache ({2:.0%}), {3:.1f} MB not decompressed".format(
+            cache["hits"], reads, cache["hits"] / float(reads), cache["bytes_saved"] / 1048576.0))
+    try:
+        blobs = []
+        for folder in os.scandir(ATTACHMENT_CACHE_PATH):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    blobs.append((entry.stat().st_mtime, entry.stat().st_size, entry.name, entry.path))
+        cache_size = sum(blob[1] for blob in blobs)
+        evicted = set()
+        for modified, size, blob_hash, blob_path in sorted(blobs):
+            if cache_size <= ATTACHMENT_CACHE_SIZE:
+                break
+            os.remove(blob_path)
+            evicted.add(blob_hash)
+            cache_size -= size
+        index = dict((key, blob_hash) for key, blob_hash in cache["index"].items() if blob_hash not in evicted)
+        if len(evicted) > 0:
+            arcpy.AddMessage("  {0} least recently used attachments removed from the cache".format(len(evicted)))
+        #write to a temporary file and replace so the index is never left partly written
+        with tempfile.NamedTemporaryFile('w', dir=ATTACHMENT_CACHE_PATH, suffix=".json", delete=False) as index_file:
+            json.dump(index, index_file)
+        os.replace(index_file.name, os.path.join(ATTACHMENT_CACHE_PATH, "index.json"))
+    except (IOError, OSError):
+        arcpy.AddWarning("  Unable to update the attachment cache: " + ATTACHMENT_CACHE_PATH)
+
+def find_duplicate_attachments(files, zip_file=None, cache=None):
+    """Returns {<PathToFile> : <PathToFirstCopy>} for the files with the same content as an earlier file"""
+    """The files are zip members of zip_file when it's given. Only files that share their size with another file are hashed,
+    members found in the attachment cache use the cached hash"""
+    #a file can be matched by more than one table
+    files = list(dict.fromkeys(files))
+    sizes = dict((file, file.file_size if zip_file is not None else os.path.getsize(file)) for file in files)
+    size_counts = {}
+    for size in sizes.values():
+        size_counts[size] = size_counts.get(size, 0) + 1
+    candidates = [file for file in files if size_counts[sizes[file]] > 1]
+    hashes = {}
+    if cache is not None:
+        hashes = dict((file, cache["index"][get_cache_key(file)]) for file in candidates if get_cache_key(file) in cache["index"])
+    uncached = [file for file in candidates if file not in hashes]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=ATTACHMENT_HASH_THREADS) as executor:
+        hashes.update(zip(uncached, executor.map(functools.partial(hash_file, zip_file=zip_file), uncached)))
+    first_copies = {}
+    duplicates = {}
+    for file in candidates:
+        first_copy = first_copies.setdefault((sizes[file], hashes[file]), file)
+        if first_copy != file:
+            duplicates[file] = first_copy
+    total_size = sum(sizes.values())
+    duplicate_size = sum(sizes[file] for file in duplicates)
+    arcpy.AddMessage("  {0} attachment files, {1} duplicates: {2:.1f} MB of {3:.1f} MB is duplicate data".format(
+        len(files), len(duplicates), duplicate_size / 1048576.0, total_size / 1048576.0))
+    return duplicates
+
+def hash_file(path, zip_file=None, block_size=1024 * 1024):
+    """Returns the content hash of the file or member of zip_file, read in blocks"""
+    file_hash = hashlib.sha256()
+    with (zip_file.open(path, 'r') if zip_file is not None else open(path, 'rb')) as attachment_file:
+        for block in iter(functools.partial(attachment_file.read, block_size), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+def link_duplicate_attachments(table_matches, duplicates, out_gdb_path):
+    """Writes a row to ATTACHMENT_LINK_TABLE for each record of a duplicate file with the attachment id of the stored copy"""
+    stored = {}
+    for table, idField, matches in table_matches:
+        for record_id, files in matches.items():
+            for file in files:
+                if file not in duplicates:
+                    stored.setdefault(file, (table, idField, record_id))
+    #ATTACHMENTID of each stored copy, found by the record's object id and the file name
+    attachment_ids = {}
+    first_copies = set(duplicates.values())
+    for table, idField, matches in table_matches:
+        copies = dict((file, record_id) for file, (stored_table, field, record_id) in stored.items()
+                      if stored_table == table and file in first_copies)
+        if len(copies) == 0:
+            continue
+        in_table = arcpy.env.workspace + os.sep + table
+        with arcpy.da.SearchCursor(in_table, ["OID@", idField]) as cursor:
+            object_ids = dict((row[1], row[0]) for row in cursor)
+        with arcpy.da.SearchCursor(in_table + "__ATTACH", ["REL_OBJECTID", "ATT_NAME", "ATTACHMENTID"]) as cursor:
+            #the latest attachment wins if the record already had a file with the same name
+            attachments = dict(((row[0], row[1]), row[2]) for row in sorted(cursor, key=lambda row: row[2]))
+        for file, record_id in copies.items():
+            attachment_id = attachments.get((object_ids.get(record_id), get_attachment_name(file)))
+            if attachment_id is not None:
+                attachment_ids[file] = (table + "__ATTACH", attachment_id)
+
+    link_table = out_gdb_path + os.sep + ATTACHMENT_LINK_TABLE
+    if not arcpy.Exists(link_table):
+        arcpy.CreateTable_management(out_gdb_path, ATTACHMENT_LINK_TABLE)
+        arcpy.AddField_management(link_table, "TableName", "TEXT", field_length=64)
+        arcpy.AddField_management(link_table, "RecordID", "TEXT", field_length=255)
+        arcpy.AddField_management(link_table, "FileName", "TEXT", field_length=255)
+        arcpy.AddField_management(link_table, "AttachmentTable", "TEXT", field_length=64)
+        arcpy.AddField_management(link_table, "AttachmentID", "LONG")
+    linked = 0
+    with arcpy.da.InsertCursor(link_table, ["TableName", "RecordID", "FileName", "AttachmentTable", "AttachmentID"]) as cursor:
+        for table, idField, matches in table_matches:
+            for record_id, files in matches.items():
+                for file in files:
+                    if file in duplicates and duplicates[file] in attachment_ids:
+                        attachment_table, attachment_id = attachment_ids[duplicates[file]]
+                        cursor.insertRow([table, record_id, get_attachment_name(file), attachment_table, attachment_id])
+                        linked += 1
+    arcpy.AddMessage("  {0} duplicate attachments linked in {1}".format(linked, ATTACHMENT_LINK_TABLE))
+
+def get_record_ids(in_table, att_id_field):
+    """Returns the ids of the records of the table"""
+    with arcpy.da.SearchCursor(in_table, [att_id_field]) as cursor:
+        return set(row[0] for row in cursor)
+
+def get_records_without_attachments(in_table, att_id_field):
+    """Returns the ids of the records of the table that have no attachments"""
+    with arcpy.da.SearchCursor(in_table + "__ATTACH", ["REL_OBJECTID"]) as cursor:
+        attached = set(row[0] for row in cursor)
+    with arcpy.da.SearchCursor(in_table, ["OID@", att_id_field]) as cursor:
+        return set(row[1] for row in cursor if row[0] not in attached)
+
+def create_attachment_table(matches, id_field_name, value_field_name):
     """The GP tool CreateAttachmentTable does not support the folder structure"""
     """ we are dealing with...handeling here"""
+    """matches is the {<RecordID> : [<PathToFile>]} part of the attachment index for one table"""
     fields = [id_field_name, value_field_name]
 
     #Table (JoinFieldIDValue, path to resource)
@@ -286,96 +1155,417 @@ def create_attachment_table(parent_folder, id_field_name, value_field_name):
 
     cur = arcpy.da.InsertCursor(tmp_table, fields)
 
-    for subdir, dirs, files in os.walk(parent_folder):
+    for record_id, files in matches.items():
         for file in files:
-            cur.insertRow((os.path.basename(subdir), os.path.join(subdir, file)))
+            cur.insertRow((record_id, file))
     del cur
     return tmp_table
  
 def check_date(value):
     """Test value to confirm if it's a supported date value"""
-    date_formats = ["%m/%d/%y", "%m/%d/%Y"]
     is_date = False
     test_complete = False
     if value != "":
         test_complete = True
-        if len(value.split("/")) == 3:
-            for format in date_formats:
-                try:
-                    datetime.datetime.strptime(value, format)
-                    is_date = True
-                    break
-                except:
-                    is_date = False
+        is_date = parse_date(value) is not None
     return is_date, test_complete
 
-def check_float(value):
-    """TypeCheck value to confirm if it's a valid float"""
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(value):
+    """Returns the datetime of a supported date value or None"""
+    if DATE_PATTERN.match(value) is None:
+        return None
+    for format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, format)
+        except ValueError:
+            pass
+    return None
+
+def parse_coordinate(value):
+    """Returns the value as a float or None if it's not a valid coordinate"""
     try:
-        float(value)
-        return True
-    except ValueError:
-        return False
+        return float(value)
+    except (TypeError, ValueError):
+        return None
 
-def reverse_numeric(x, y):
-    return y - x
+def convert_number(value, number_type):
+    """Returns the value as a number of the given type or None if it's empty"""
+    """A value that is not a valid number is also None, with a warning"""
+    if value == "":
+        return None
+    try:
+        return number_type(value)
+    except (TypeError, ValueError):
+        arcpy.AddWarning("  {0} is not a valid number, it is loaded as NULL".format(value))
+        return None
 
-def remove_null(collection, null_fields):
-    if len(null_fields) > 0:
-        #sort the values so we can remove the highest index first and not affect the lower index values
-        null_fields_sort = sorted(null_fields, cmp=reverse_numeric)
-        for nf in null_fields_sort:
-            del collection[nf]
+def convert_date(value):
+    """Returns the datetime of a supported date value otherwise None"""
+    return parse_date(value)
 
-def get_fields(reader):
+def remove_null(fields, null_fields):
+    """Returns the field definitions without the fields that have a NULL name, re-indexed from 0"""
+    kept_fields = [fields[index] for index in sorted(fields) if index not in null_fields]
+    return dict(enumerate(kept_fields))
+
+def build_row_projection(row_length, null_fields):
+    """Returns a callable that drops the columns with a NULL field name from a csv row"""
+    keep = [index for index in range(row_length) if index not in null_fields]
+    if len(keep) == row_length:
+        return list
+    if len(keep) == 1:
+        return lambda row: [row[keep[0]]]
+    get_values = operator.itemgetter(*keep)
+    return lambda row: list(get_values(row))
+
+def build_row_converter(header, fields, null_fields, field_lat=None, field_lon=None):
+    """Builds the function add_data uses to convert a csv row to the values that are inserted"""
+    """The converters are resolved once from the field definitions so no per value type checks are needed"""
+    project = build_row_projection(len(header), null_fields)
+    column_converters = []
+    for index, f in sorted(fields.items()):
+        if f[2] == "Date":
+            column_converters.append((index, convert_date))
+        elif f[2] in ("Short", "Long"):
+            column_converters.append((index, functools.partial(convert_number, number_type=int)))
+        elif f[2] == "Double":
+            column_converters.append((index, functools.partial(convert_number, number_type=float)))
+    column_converters = tuple(column_converters)
+
+    lat_index = None
+    lon_index = None
+    if field_lat != None and field_lon != None:
+        names = project(header)
+        if field_lat in names and field_lon in names:
+            lat_index = names.index(field_lat)
+            lon_index = names.index(field_lon)
+        else:
+            arcpy.AddWarning("  {0} and {1} fields were not found, features will have no geometry".format(field_lat, field_lon))
+    is_spatial = field_lat != None and field_lon != None
+
+    def convert_row(row):
+        values = project(row)
+        #remove non ascii if any, the row is checked as a whole so the common all ascii row costs one call
+        try:
+            "".join(values).encode("ascii")
+        except UnicodeEncodeError:
+            values = [value.encode("ascii", "ignore").decode("ascii") for value in values]
+        if is_spatial:
+            if lat_index is None:
+                shape = None
+            else:
+                x = parse_coordinate(values[lon_index])
+                y = parse_coordinate(values[lat_index])
+                if x is None or y is None:
+                    values[lat_index], values[lon_index] = "0", "0"
+                    x, y = 0.0, 0.0
+                shape = (x, y)
+        for index, convert in column_converters:
+            values[index] = convert(values[index])
+        if is_spatial:
+            values.append(shape)
+        return values
+
+    return convert_row
+
+def get_fields(reader, cached_fields=None):
     """Reads field values to determine appropriate field length"""
+    """cached_fields from the schema registry are used as the starting point when given"""
     fields = {}
-    first_row = True
+    batch = []
     #first read the records and build the list
     for row in reader:  
-        index = 0   
-        #{fieldIndex:(fieldName, size, type, testComplete)}
-        if first_row:
-            first_row = False
-            for field_name in row:               
-                fields[index] = [field_name, 1000, "Text", False] #default to "Text"
-                index += 1
-        else:
-            error_row = True if len(row) != len(fields) else False
-            for value in row:
-                if error_row and index == len(fields):
-                    break
-                current_length = len(value)
-                if fields[index][1] < current_length: 
-                    if current_length in range(0, 249): 
-                        fields[index][1] = 1500
-                    elif current_length in range(250, 499):
-                        fields[index][1] = 3000
-                    elif current_length in range(500, 999):
-                        fields[index][1] = 5000
-                    else:
-                        #if the value exceeds 1000 then round it UP to the nearest thousand
-                        # and use that for the length
-                        current_length -= current_length % -1000
-                        fields[index][1] = current_length
-                if not fields[index][3]:
-                    is_date, test_complete = check_date(value)
-                    if is_date:
-                        fields[index][2] = "Date"
-                    fields[index][3] = test_complete
-                index += 1
-
-    del row
+        if len(fields) == 0:
+            add_field_names(fields, row, cached_fields)
+            continue
+        batch.append(row)
+        if len(batch) == SPOOL_BATCH_SIZE:
+            update_fields(fields, batch)
+            batch = []
+    if len(batch) > 0:
+        update_fields(fields, batch)
+    finish_fields(fields)
     return fields
 
+def add_field_names(fields, row, cached_fields=None):
+    """Adds a field definition for each column of the header row"""
+    #{fieldIndex:(fieldName, size, type, testComplete, numericState, maxLength)}
+    if cached_fields is not None:
+        for index, f in cached_fields.items():
+            fields[index] = [f[0], f[1], f[2], f[3], list(f[4]) if f[4] is not None else None, f[5]]
+        return
+    key_fields = get_key_field_names()
+    for index, field_name in enumerate(row):
+        #fields relationship discovery looks at stay Text so they can be related to the other keys
+        is_key_field = field_name in key_fields or (RELATIONSHIP_DISCOVERY is not None and DISCOVERY_KEY_PATTERN.search(field_name))
+        numeric_state = [None, None, None] if INFER_NUMERIC_TYPES and not is_key_field else None
+        fields[index] = [field_name, 1000, "Text", False, numeric_state, 0] #default to "Text"
+
+def update_fields(fields, rows):
+    """Updates the field definitions with a batch of rows, the values are processed a column at a time"""
+    #missing values are padded with "" and values past the last field are ignored
+    columns = itertools.zip_longest(*rows, fillvalue="")
+    for index, values in zip(range(len(fields)), columns):
+        f = fields[index]
+        #the exact length is kept, the declared length is planned once the scan is finished
+        current_length = max(map(len, values))
+        if f[5] < current_length: 
+            f[5] = current_length
+        if not f[3]:
+            #the first value that isn't empty decides if the field is a date
+            value = next((value for value in values if value != ""), None)
+            if value is not None:
+                is_date, test_complete = check_date(value)
+                if is_date:
+                    f[2] = "Date"
+                f[3] = test_complete
+        if f[4] is not None and f[4][0] != "Text" and f[2] != "Date":
+            f[4] = merge_numeric_state(f[4], classify_values(values))
+
+def finish_fields(fields):
+    """Sets the field types and lengths once every row has been read"""
+    set_field_types(fields)
+    plan_field_lengths(fields)
+
+def plan_field_lengths(fields):
+    """Sets the declared length of each field from the longest value seen using LENGTH_POLICY"""
+    for f in fields.values():
+        f[1] = plan_field_length(f[5])
+
+def plan_field_length(max_length):
+    """Returns the declared length for a text field whose longest value has max_length characters"""
+    if LENGTH_POLICY == "legacy":
+        #if the value exceeds 1000 then round it UP to the nearest thousand
+        # and use that for the length
+        return max(1000, max_length - max_length % -1000)
+    length = int(math.ceil(max_length * (1 + LENGTH_HEADROOM)))
+    length -= length % -LENGTH_ROUNDING
+    return max(LENGTH_MINIMUM, length)
+
+def report_field_lengths(table_name, fields):
+    """Reports the declared versus observed text field widths and the space saved against the legacy lengths"""
+    text_fields = [f for index, f in sorted(fields.items()) if f[2] == "Text"]
+    if len(text_fields) == 0:
+        return
+    declared = sum(int(f[1]) for f in text_fields)
+    observed = sum(f[5] for f in text_fields)
+    legacy = sum(max(1000, f[5] - f[5] % -1000) for f in text_fields)
+    arcpy.AddMessage("  {0} text fields: declared {1} / observed {2} characters per row ({3} policy, legacy lengths {4})".format(
+        len(text_fields), declared, observed, LENGTH_POLICY, legacy))
+    if LENGTH_REPORT_FIELDS:
+        for f in text_fields:
+            arcpy.AddMessage("    {0}: declared {1} / observed {2}".format(f[0], int(f[1]), f[5]))
+
+def set_field_types(fields):
+    """Sets the type of the fields that are not dates from the numeric state collected by update_fields"""
+    for f in fields.values():
+        if f[2] != "Date" and f[4] is not None:
+            f[2] = numeric_field_type(f[4])
+
+def get_key_field_names():
+    """Returns the key fields used in RELATIONSHIPS and TABLES_WITH_ATTACHMENTS"""
+    key_fields = set(TABLES_WITH_ATTACHMENTS.values())
+    for table_maps in RELATIONSHIPS.values():
+        for table_map in table_maps:
+            key_fields.update(table_map.values())
+    return key_fields
+
+def classify_values(values):
+    """Classifies the values of a column batch with vectorized NumPy string operations"""
+    """Returns [kind, minimum, maximum] where kind is None (all empty), "Integer", "Double" or "Text" """
+    if numpy is None:
+        return classify_values_python(values)
+    column = numpy.array(values, dtype=str)
+    column = column[column != ""]
+    if column.size == 0:
+        return [None, None, None]
+    if (numpy.char.strip(column, NUMERIC_CHARACTERS) != "").any():
+        return ["Text", None, None]
+    digits = numpy.char.lstrip(column, "+-")
+    #leading zeros (zip codes, phone numbers) would be lost in a numeric field
+    if (numpy.char.startswith(digits, "0") & (numpy.char.str_len(digits) > 1) & ~numpy.char.startswith(digits, "0.")).any():
+        return ["Text", None, None]
+    whole = numpy.char.isdigit(digits)
+    #whole numbers too long for a 64 bit integer are identifiers, a Double would lose digits
+    if (numpy.char.str_len(digits[whole]) > 18).any():
+        return ["Text", None, None]
+    state = [None, None, None]
+    try:
+        if whole.any():
+            integers = column[whole].astype(numpy.int64)
+            state = ["Integer", int(integers.min()), int(integers.max())]
+        if not whole.all():
+            numbers = column[~whole].astype(numpy.float64)
+            if not numpy.isfinite(numbers).all():
+                return ["Text", None, None]
+            state = merge_numeric_state(state, ["Double", None, None])
+    except (ValueError, OverflowError):
+        return ["Text", None, None]
+    return state
+
+def classify_values_python(values):
+    """Classifies the values of a column batch when NumPy is not available, see classify_values"""
+    state = [None, None, None]
+    for value in values:
+        if value == "":
+            continue
+        if value.strip(NUMERIC_CHARACTERS) != "":
+            return ["Text", None, None]
+        digits = value.lstrip("+-")
+        if digits.startswith("0") and len(digits) > 1 and not digits.startswith("0."):
+            return ["Text", None, None]
+        try:
+            if digits.isdigit():
+                if len(digits) > 18:
+                    return ["Text", None, None]
+                number = int(value)
+                state = merge_numeric_state(state, ["Integer", number, number])
+            else:
+                if not math.isfinite(float(value)):
+                    return ["Text", None, None]
+                state = merge_numeric_state(state, ["Double", None, None])
+        except ValueError:
+            return ["Text", None, None]
+    return state
+
+def merge_numeric_state(state, other):
+    """Combines two [kind, minimum, maximum] numeric states"""
+    if state[0] is None:
+        return list(other)
+    if other[0] is None:
+        return list(state)
+    if state[0] == "Text" or other[0] == "Text":
+        return ["Text", None, None]
+    if state[0] == "Integer" and other[0] == "Integer":
+        return ["Integer", min(state[1], other[1]), max(state[2], other[2])]
+    #whole numbers past the Long range are kept as Text, see numeric_field_type
+    for kind, minimum, maximum in (state, other):
+        if kind == "Integer" and numeric_field_type([kind, minimum, maximum]) == "Text":
+            return ["Text", None, None]
+    return ["Double", None, None]
+
+def numeric_field_type(state):
+    """Returns the smallest field type that holds every value of the numeric state"""
+    kind, minimum, maximum = state
+    if kind == "Integer":
+        if -32768 <= minimum and maximum <= 32767:
+            return "Short"
+        if -2147483648 <= minimum and maximum <= 2147483647:
+            return "Long"
+        #larger whole numbers are identifiers, a Double would lose digits
+        return "Text"
+    if kind == "Double":
+        return "Double"
+    return "Text"
+
+def spool_table(open_table, cached_fields=None, memory_limit=SPOOL_MEMORY_LIMIT):
+    """Parses the table once, building the field definitions while the rows are buffered"""
+    """Rows are written to a temporary spool as length prefixed marshal batches, see read_spool"""
+    """cached_fields from the schema registry are used as the starting point when given"""
+    """The spool is moved to disk once it holds more than memory_limit bytes"""
+    fields = {}
+    spool = tempfile.SpooledTemporaryFile(max_size=memory_limit)
+    try:
+        batch = []
+        with open_table() as csv_file:
+            reader = csv.reader(csv_file, delimiter=',', quotechar='"')
+            header = next(reader, None)
+            if header is not None:
+                add_field_names(fields, header, cached_fields)
+                write_spool_batch(spool, [header])
+            for row in reader:
+                batch.append(row)
+                if len(batch) == SPOOL_BATCH_SIZE:
+                    update_fields(fields, batch)
+                    write_spool_batch(spool, batch)
+                    batch = []
+        if len(batch) > 0:
+            update_fields(fields, batch)
+            write_spool_batch(spool, batch)
+    except Exception:
+        spool.close()
+        raise
+    finish_fields(fields)
+    return fields, spool
+
+def read_header(open_table):
+    """Returns the row of column headers of the table"""
+    with open_table() as csv_file:
+        reader = csv.reader(csv_file, delimiter=',', quotechar='"')
+        return next(reader, None)
+
+def get_schema_key(table_name, header):
+    """Returns the schema registry key for the table and its row of column headers"""
+    header_hash = hashlib.sha1("\x1f".join(header).encode("utf-8")).hexdigest()
+    #typed and legacy text schemas are inferred differently so they are kept apart
+    schema_kind = "typed" if INFER_NUMERIC_TYPES else "text"
+    return "{0}|{1}|{2}".format(table_name, schema_kind, header_hash)
+
+def load_schema_registry():
+    """Reads the schema registry, an empty registry is returned if it doesn't exist or can't be read"""
+    try:
+        with open(SCHEMA_REGISTRY_PATH, 'r') as registry_file:
+            return json.load(registry_file)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def lookup_schema(table_name, header):
+    """Returns the cached field definitions of the table or None"""
+    if header is None:
+        return None
+    entry = load_schema_registry().get(get_schema_key(table_name, header))
+    if entry is None or len(entry["fields"]) != len(header):
+        return None
+    numeric_state = lambda state: state if INFER_NUMERIC_TYPES else None
+    cached_fields = {}
+    for index, (field_name, field_type, test_complete, state, max_length) in enumerate(entry["fields"]):
+        #numeric types are rebuilt from the cached state so tonight's values can widen them
+        cached_fields[index] = [field_name, 0, "Date" if field_type == "Date" else "Text", test_complete, numeric_state(state), max_length]
+    return cached_fields
+
+def save_schema(table_name, header, fields):
+    """Stores the field definitions of the table in the schema registry, field names must be validated"""
+    entry = {
+        "table" : table_name,
+        "fields" : [[f[0], f[2], f[3], f[4], f[5]] for index, f in sorted(fields.items())]
+    }
+    registry = load_schema_registry()
+    key = get_schema_key(table_name, header)
+    if registry.get(key) == entry:
+        return
+    registry[key] = entry
+    #write to a temporary file and replace so a concurrent reader never sees a partial registry
+    try:
+        registry_folder = os.path.dirname(SCHEMA_REGISTRY_PATH)
+        with tempfile.NamedTemporaryFile('w', dir=registry_folder, suffix=".json", delete=False) as registry_file:
+            json.dump(registry, registry_file, indent=1, sort_keys=True)
+        os.replace(registry_file.name, SCHEMA_REGISTRY_PATH)
+    except (IOError, OSError):
+        arcpy.AddWarning("  Unable to update the schema registry: " + SCHEMA_REGISTRY_PATH)
+
+def write_spool_batch(spool, batch):
+    """Appends a batch of rows to the spool"""
+    data = marshal.dumps(batch)
+    spool.write(struct.pack("<I", len(data)))
+    spool.write(data)
+
+def read_spool(spool):
+    """Yields the rows buffered by spool_table in their original order"""
+    spool.seek(0)
+    while True:
+        size = spool.read(4)
+        if len(size) < 4:
+            break
+        for row in marshal.loads(spool.read(struct.unpack("<I", size)[0])):
+            yield row
+
 def tables_to_gdb(folder_path, out_gdb_path):    
     """Rename .mer to .csv and load the data"""
     try:
         #find all *.mer files
         new_file_ext = ".csv"
         old_file_ext = ".mer"
-        latField = None
-        lonField = None
         files = glob.glob(folder_path + os.sep + "*" + old_file_ext)
 
         for file in files:
@@ -388,169 +1578,879 @@ def tables_to_gdb(folder_path, out_gdb_path):
             #rename *.mer to *.csv
             shutil.move(current_file, new_file)
 
-            is_spatial = False
             baseName = new_file_name.replace(new_file_ext, '')
-            if baseName in NAMES_OF_SPATIAL_TABLES: 
-                is_spatial = True
-                latField = NAMES_OF_SPATIAL_TABLES[baseName]['LatField']
-                lonField = NAMES_OF_SPATIAL_TABLES[baseName]['LonField']
-            t = create_and_populate_table(new_file, out_gdb_path, is_spatial, latField, lonField)
+            load_table(baseName, functools.partial(open, new_file, 'rt'), out_gdb_path)
             #cleanup old file
             os.remove(new_file)
     except Exception:
         arcpy.AddError("Error occurred while loading the data")
         raise
 
-def create_and_populate_table(table, out_gdb, is_spatial, lat_field=None, lon_field=None):
+def zip_tables_to_gdb(path_to_zip, out_gdb_path):
+    """Load the .mer files directly from the zip without extracting them, in WORKERS worker processes"""
+    """With a single worker main reads the zips with zips_to_gdb instead"""
+    try:
+        return parallel_zip_tables_to_gdb(path_to_zip, out_gdb_path, WORKERS)
+    except Exception:
+        arcpy.AddError("Error occurred while loading the data")
+        raise
+
+def zips_to_gdb(zip_paths, out_gdb_path):
+    """Load the .mer files of the zips, the next tables are parsed on threads while the current one is written"""
+    """With MERGE_ZIPS each table is written once with the rows of every zip, otherwise zip by zip"""
+    try:
+        zip_files = [zipfile.ZipFile(zip_path, 'r') for zip_path in zip_paths]
+        try:
+            if (MERGE_ZIPS or INCREMENTAL_UPDATE) and len(zip_files) > 1:
+                plan = plan_zip_merge(zip_files)
+                arcpy.AddMessage("Merging {0} tables from {1} zips...".format(len(plan), len(zip_files)))
+            else:
+                plan = [(table_name, [(zip_file, member)]) for zip_file in zip_files for table_name, member in list_zip_tables(zip_file)]
+            load_planned_tables(plan, out_gdb_path)
+        finally:
+            for zip_file in zip_files:
+                zip_file.close()
+    except Exception:
+        arcpy.AddError("Error occurred while loading the data")
+        raise
+
+def plan_zip_merge(zip_files):
+    """Returns [(table name, [(zip file, member)])] sorted by table name, the members are in zip order"""
+    members = {}
+    for zip_file in zip_files:
+        for table_name, member in list_zip_tables(zip_file):
+            members.setdefault(table_name, []).append((zip_file, member))
+    return sorted(members.items(), key=lambda table: table[0].lower())
+
+def load_planned_tables(plan, out_gdb_path):
+    """Spools the members of each planned table on a thread pool and loads the tables in plan order"""
+    """Up to PARSE_AHEAD tables after the one being written are spooled in the meantime"""
+    """Every member of those tables is spooled at once, they share SPOOL_MEMORY_LIMIT"""
+    spooled = []
+    in_flight = max(sum(len(members) for name, members in plan[position:position + 1 + PARSE_AHEAD])
+                    for position in range(len(plan))) if plan else 1
+    memory_limit = SPOOL_MEMORY_LIMIT // max(1, in_flight)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, PARSE_THREADS)) as executor:
+            for position, (table_name, members) in enumerate(plan):
+                while len(spooled) < min(position + 1 + PARSE_AHEAD, len(plan)):
+                    next_name, next_members = plan[len(spooled)]
+                    spooled.append([executor.submit(spool_zip_member, next_name, zip_file, member, memory_limit) for zip_file, member in next_members])
+                tables = [future.result() for future in spooled[position]]
+                load_spooled_table(table_name, [table for table in tables if table is not None], out_gdb_path)
+    finally:
+        #close the spools that were not loaded when a table fails
+        for futures in spooled:
+            for future in futures:
+                if not future.cancel() and future.exception() is None and future.result() is not None:
+                    future.result()[2].close()
+
+def spool_zip_member(table_name, zip_file, member, memory_limit=SPOOL_MEMORY_LIMIT):
+    """Spools one member of a zip, returns (header, fields, spool) or None for an empty table"""
+    """Runs on a parse thread so it doesn't use arcpy, the member is spooled whatever SINGLE_PASS_LOAD is"""
+    """The spool is moved to disk once it holds more than memory_limit bytes"""
+    open_table = functools.partial(open_zip_member, zip_file, member)
+    cached_fields = lookup_schema(table_name, read_header(open_table)) if SCHEMA_REGISTRY else None
+    fields, spool = spool_table(open_table, cached_fields, memory_limit)
+    header = next(read_spool(spool), None)
+    if header is None:
+        spool.close()
+        return None
+    return header, fields, spool
+
+def load_spooled_table(table_name, tables, out_gdb_path):
+    """Merges the schemas of the spooled (header, fields, spool) tables and loads all the rows with one insert"""
+    try:
+        if len(tables) == 0:
+            return
+        union_keys = merge_column_keys([header for header, fields, spool in tables])
+        positions = [get_union_positions(header, union_keys) for header, fields, spool in tables]
+        fields = merge_range_fields([dict((index, zip_fields[position]) for index, position in enumerate(zip_positions) if position is not None)
+                                     for (header, zip_fields, spool), zip_positions in zip(tables, positions)])
+        if len(tables) > 1:
+            arcpy.AddMessage("  {0}: {1} columns from {2} zips".format(table_name, len(union_keys), len(tables)))
+        rows = read_merged_spools(table_name, tables, union_keys, positions)
+        if INCREMENTAL_UPDATE:
+            #schema changes can't be made in the edit session the rows are written in
+            create_record_hash_table(out_gdb_path)
+            rows = incremental_rows(table_name, tables, rows, out_gdb_path)
+        elif UPSERT_RECORDS and table_name in get_primary_keys():
+            rows = upsert_rows(table_name, tables, rows)
+        load_table(table_name, None, out_gdb_path, fields, rows=rows)
+
+        if SCHEMA_REGISTRY:
+            #register the merged schema under the header of every zip, see add_fields for the validated names
+            for (header, zip_fields, spool), zip_positions in zip(tables, positions):
+                merged_fields = {}
+                for index, position in enumerate(zip_positions):
+                    if position is not None:
+                        f = fields[index]
+                        merged_fields[position] = [validate_field_name(str(zip_fields[position][0]), out_gdb_path)] + f[1:]
+                save_schema(table_name, header, merged_fields)
+    finally:
+        for header, fields, spool in tables:
+            spool.close()
+
+def get_column_keys(header):
+    """Returns a (name, occurrence) key for each column so repeated names keep their own column"""
+    occurrences = {}
+    keys = []
+    for name in header:
+        keys.append((name, occurrences.get(name, 0)))
+        occurrences[name] = occurrences.get(name, 0) + 1
+    return keys
+
+def merge_column_keys(headers):
+    """Returns the column keys of every header in order of first appearance"""
+    union_keys = []
+    for header in headers:
+        for key in get_column_keys(header):
+            if key not in union_keys:
+                union_keys.append(key)
+    return union_keys
+
+def get_union_positions(header, union_keys):
+    """Returns the position in the header of each merged column, None when the header doesn't have it"""
+    keys = dict((key, position) for position, key in enumerate(get_column_keys(header)))
+    return [keys.get(key) for key in union_keys]
+
+def read_merged_spools(table_name, tables, union_keys, positions):
+    """Yields the merged header then the spooled rows of every zip with their values in merged column order"""
+    """Columns a zip doesn't have are left empty"""
+    yield [name for name, occurrence in union_keys]
+    for (header, fields, spool), zip_positions in zip(tables, positions):
+        rows = read_spool(spool)
+        next(rows)
+        if zip_positions == list(range(len(union_keys))):
+            #same columns in the same order, add_data fits the rows
+            for row in rows:
+                yield row
+            continue
+        row_length = len(header)
+        #the empty value appended to every row fills the missing columns
+        get_values = operator.itemgetter(*[row_length if position is None else position for position in zip_positions])
+        for row_index, row in enumerate(rows, 2):
+            if len(row) != row_length:
+                row = fit_row(row, row_length, row_index, table_name)
+            row.append("")
+            values = get_values(row)
+            yield list(values) if len(zip_positions) > 1 else [values]
+
+def get_primary_keys():
+    """Returns {<TableName> : <KeyFieldName>} from the parent entries of RELATIONSHIPS"""
+    return dict((parent_table, table_maps[0][parent_table]) for parent_table, table_maps in RELATIONSHIPS.items()
+                if parent_table in table_maps[0])
+
+def upsert_rows(table_name, tables, rows):
+    """Yields the header then only the winning row of each primary key"""
+    """rows yields the header and the rows of the spooled tables in their original order"""
+    key_field = get_primary_keys()[table_name]
+    kept = find_kept_rows(*scan_spooled_rows(tables, key_field))
+    arcpy.AddMessage("  {0}: keeping {1} of {2} rows by {3}".format(table_name, kept.count(1), len(kept), key_field))
+    yield next(rows)
+    for ordinal, row in enumerate(rows):
+        if kept[ordinal]:
+            yield row
+
+def scan_spooled_rows(tables, key_field, record_keys=None, record_hashes=None):
+    """Returns the key hash and modified date of every spooled row as arrays for find_kept_rows"""
+    """The key and content hash of each row are appended to record_keys and record_hashes when given"""
+    #python's hash of a string is never -1 so it marks the rows without a key
+    keys = array.array('q')
+    dates = array.array('q')
+    for header, fields, spool in tables:
+        key_index = header.index(key_field) if key_field in header else None
+        date_index = next((index for index, name in enumerate(header) if name.lower().endswith(DATE_MODIFIED_SUFFIX.lower())), None)
+        spooled_rows = read_spool(spool)
+        next(spooled_rows)
+        for row in spooled_rows:
+            key = row[key_index] if key_index is not None and key_index < len(row) else ""
+            keys.append(hash(key) if key != "" else -1)
+            modified = parse_date(row[date_index]) if date_index is not None and date_index < len(row) else None
+            dates.append(modified.toordinal() if modified is not None else 0)
+            if record_keys is not None:
+                record_keys.append(key)
+            if record_hashes is not None:
+                record_hashes.append(get_record_hash(header, row))
+    return keys, dates
+
+def get_record_hash(header, row):
+    """Returns the content hash of a row, it doesn't depend on the column order or on empty columns"""
+    content = "\x1e".join(sorted(name + "\x1f" + value for name, value in zip(header, row) if value != ""))
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=8).hexdigest()
+
+def incremental_rows(table_name, tables, rows, out_gdb_path):
+    """Yields the header then only the rows that are new or changed since the last import"""
+    """Runs once the output table's fields were widened by align_fields, the records that changed or are no longer
+    exported are deleted first. create_and_populate_table consumes the rows in an edit session so the deletes are
+    rolled back with the inserts if the load fails. When the table isn't in the output gdb yet every row is written"""
+    out_table = out_gdb_path + os.sep + arcpy.ValidateTableName(table_name, out_gdb_path)
+    #without DIRECT_WRITE a new table is loaded in_memory and copied to the output gdb afterwards
+    out_table_exists = arcpy.Exists(out_table)
+    key_field = get_primary_keys().get(table_name)
+    header = next(rows)
+    if key_field is None or key_field not in header:
+        #without a key the table is replaced, TruncateTable can't be rolled back
+        if out_table_exists:
+            delete_records(out_table, "OID@", set())
+        yield header
+        for row in rows:
+            yield row
+        return
+
+    record_keys = []
+    record_hashes = []
+    kept = find_kept_rows(*scan_spooled_rows(tables, key_field, record_keys, record_hashes))
+    #the hashes of a table that was deleted since the last import don't describe any records
+    stored_hashes = read_record_hashes(out_gdb_path, table_name) if out_table_exists else {}
+    record_hash_map = {}
+    write = bytearray(len(kept))
+    for ordinal, key in enumerate(record_keys):
+        if not kept[ordinal]:
+            continue
+        if key != "":
+            record_hash_map[key] = record_hashes[ordinal]
+            if stored_hashes.get(key) == record_hashes[ordinal]:
+                continue
+        #rows without a key can't be matched so they are replaced
+        write[ordinal] = 1
+    unchanged_keys = set(key for key, record_hash in record_hash_map.items() if stored_hashes.get(key) == record_hash)
+    #every other record is deleted, including records loaded before the hashes were kept
+    deleted = delete_records(out_table, validate_field_name(key_field, out_gdb_path), unchanged_keys) if out_table_exists else 0
+    arcpy.AddMessage("  {0}: {1} records written, {2} deleted, {3} unchanged".format(table_name, write.count(1), deleted, len(unchanged_keys)))
+    yield header
+    for ordinal, row in enumerate(rows):
+        if write[ordinal]:
+            yield row
+    save_record_hashes(out_gdb_path, table_name, record_hash_map)
+
+def delete_records(out_table, key_field, kept_keys):
+    """Deletes the records of the table whose key is not in kept_keys, returns the number deleted"""
+    deleted = 0
+    with arcpy.da.UpdateCursor(out_table, [key_field]) as cursor:
+        for row in cursor:
+            if row[0] not in kept_keys:
+                cursor.deleteRow()
+                deleted += 1
+    return deleted
+
+def read_record_hashes(out_gdb_path, table_name):
+    """Returns {key : content hash} of the records of the table from RECORD_HASH_TABLE"""
+    hash_table = out_gdb_path + os.sep + RECORD_HASH_TABLE
+    if not arcpy.Exists(hash_table):
+        return {}
+    where_clause = "TableName = '{0}'".format(table_name)
+    with arcpy.da.SearchCursor(hash_table, ["RecordKey", "RecordHash"], where_clause) as cursor:
+        return dict((row[0], row[1]) for row in cursor)
+
+def create_record_hash_table(out_gdb_path):
+    """Creates RECORD_HASH_TABLE if it doesn't exist"""
+    hash_table = out_gdb_path + os.sep + RECORD_HASH_TABLE
+    if not arcpy.Exists(hash_table):
+        arcpy.CreateTable_management(out_gdb_path, RECORD_HASH_TABLE)
+        arcpy.AddField_management(hash_table, "TableName", "TEXT", field_length=64)
+        arcpy.AddField_management(hash_table, "RecordKey", "TEXT", field_length=255)
+        arcpy.AddField_management(hash_table, "RecordHash", "TEXT", field_length=16)
+
+def save_record_hashes(out_gdb_path, table_name, record_hashes):
+    """Updates RECORD_HASH_TABLE, see create_record_hash_table, to the {key : content hash} of the records of the table"""
+    hash_table = out_gdb_path + os.sep + RECORD_HASH_TABLE
+    pending = dict(record_hashes)
+    where_clause = "TableName = '{0}'".format(table_name)
+    with arcpy.da.UpdateCursor(hash_table, ["RecordKey", "RecordHash"], where_clause) as cursor:
+        for row in cursor:
+            record_hash = pending.pop(row[0], None)
+            if record_hash is None:
+                cursor.deleteRow()
+            elif record_hash != row[1]:
+                cursor.updateRow([row[0], record_hash])
+    with arcpy.da.InsertCursor(hash_table, ["TableName", "RecordKey", "RecordHash"]) as cursor:
+        for key, record_hash in pending.items():
+            cursor.insertRow([table_name, key, record_hash])
+
+def find_kept_rows(keys, dates):
+    """Returns a bytearray with 1 for each row that is kept, the newest row of each key hash wins"""
+    """Rows with the same key and date are resolved in favour of the later row, rows without a key (-1) are kept"""
+    if numpy is not None:
+        keys = numpy.frombuffer(keys, dtype=numpy.int64)
+        dates = numpy.frombuffer(dates, dtype=numpy.int64)
+        #sort by key, date then position, the last row of each key wins
+        order = numpy.lexsort((numpy.arange(len(keys)), dates, keys))
+        sorted_keys = keys[order]
+        last = numpy.ones(len(keys), dtype=bool)
+        last[:-1] = sorted_keys[:-1] != sorted_keys[1:]
+        kept = numpy.zeros(len(keys), dtype=numpy.uint8)
+        kept[order[last]] = 1
+        kept[keys == -1] = 1
+        return bytearray(kept.tobytes())
+    kept = bytearray(len(keys))
+    winners = {}
+    for ordinal, key in enumerate(keys):
+        if key == -1:
+            kept[ordinal] = 1
+            continue
+        winner = winners.get(key)
+        if winner is None or dates[ordinal] >= dates[winner]:
+            winners[key] = ordinal
+    for ordinal in winners.values():
+        kept[ordinal] = 1
+    return kept
+
+def parallel_zip_tables_to_gdb(path_to_zip, out_gdb_path, workers):
+    """Load the .mer files of the zip in a pool of worker processes"""
+    """Tables are scheduled largest first and merged into the output gdb in table name order"""
+    """Tables of SPLIT_TABLE_SIZE or more are split across the workers and merged first"""
+    with zipfile.ZipFile(path_to_zip, 'r') as zip_file:
+        tables = list_zip_tables(zip_file)
+    #schedule by uncompressed size so the largest table doesn't end up as the tail
+    schedule = sorted(tables, key=lambda table: table[1].file_size, reverse=True)
+    split_tables = [table for table in schedule if table[1].file_size >= SPLIT_TABLE_SIZE]
+    tables = [table for table in tables if table not in split_tables]
+    schedule = [table for table in schedule if table not in split_tables]
+    arcpy.AddMessage("Loading {0} tables with {1} worker processes...".format(len(tables) + len(split_tables), workers))
+    scratch_folder = tempfile.mkdtemp(prefix="cameo_")
+    try:
+        set_worker_executable()
+        loaded_tables = {}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for table_name, member in split_tables:
+                #the member has to be on disk to be memory-mapped
+                with zipfile.ZipFile(path_to_zip, 'r') as zip_file:
+                    table_path = extract_member(zip_file, member, scratch_folder)
+                split_table_to_gdb(executor, table_path, table_name, out_gdb_path, scratch_folder, workers)
+                os.remove(table_path)
+
+            futures = [executor.submit(load_zip_table_worker, path_to_zip, table_name, member.filename, scratch_folder)
+                       for table_name, member in schedule]
+            for future in concurrent.futures.as_completed(futures):
+                table_name, scratch_table = future.result()
+                loaded_tables[table_name] = scratch_table
+                arcpy.AddMessage("  loaded: {0} ({1}/{2})".format(table_name, len(loaded_tables), len(tables)))
+
+        arcpy.AddMessage("Merging tables into " + out_gdb_path + "...")
+        for table_name, member in tables:
+            merge_table(loaded_tables[table_name], out_gdb_path)
+        arcpy.AddMessage("-"*50)
+    finally:
+        shutil.rmtree(scratch_folder, ignore_errors=True)
+
+def extract_member(zip_file, member, folder):
+    """Writes a single member of the zip to the folder and returns its path"""
+    member_path = os.path.join(folder, posixpath.basename(member.filename))
+    with zip_file.open(member, 'r') as source, open(member_path, 'wb') as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+    return member_path
+
+def split_table_to_gdb(executor, table_path, table_name, out_gdb_path, scratch_folder, workers):
+    """Parses and loads record ranges of one large table in the worker processes"""
+    """The schema is inferred per range and merged, then each range is loaded and merged in order"""
+    with open(table_path, 'rb') as table_file:
+        mapped = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            range_count = max(workers, int(math.ceil(len(mapped) / float(SPLIT_RANGE_SIZE))))
+            header_end, ranges = index_record_ranges(mapped, range_count)
+        finally:
+            mapped.close()
+    arcpy.AddMessage("  {0}: split into {1} record ranges".format(table_name, len(ranges)))
+    starts = [start for start, end in ranges]
+    ends = [end for start, end in ranges]
+    range_fields = list(executor.map(infer_range_worker, itertools.repeat(table_path), itertools.repeat(header_end), starts, ends))
+    fields = merge_range_fields(range_fields)
+    futures = [executor.submit(load_range_worker, table_path, table_name, part, header_end, start, end, fields, scratch_folder)
+               for part, (start, end) in enumerate(ranges)]
+    #wait for all ranges before merging so a failed range doesn't leave a partial table behind
+    scratch_tables = [future.result() for future in futures]
+    out_table_name = arcpy.ValidateTableName(table_name, out_gdb_path)
+    for scratch_table in scratch_tables:
+        merge_table(scratch_table, out_gdb_path, out_table_name)
+    arcpy.AddMessage("  loaded: " + table_name)
+
+def count_quotes(mapped, start, end, block_size=16 * 1024 * 1024):
+    """Counts the quote characters between two offsets of the mapped file"""
+    count = 0
+    while start < end:
+        stop = min(end, start + block_size)
+        count += mapped[start:stop].count(b'"')
+        start = stop
+    return count
+
+def find_record_end(mapped, position, quotes):
+    """Returns the offset after the first newline at or after position that is not inside a quoted value"""
+    """quotes is the number of quote characters between the previous record boundary and position"""
+    while True:
+        newline = mapped.find(b"\n", position)
+        if newline < 0:
+            return len(mapped)
+        quotes += count_quotes(mapped, position, newline)
+        #an escaped quote ("") adds two so an even count means the newline is outside quotes
+        if quotes % 2 == 0:
+            return newline + 1
+        position = newline + 1
+
+def index_record_ranges(mapped, range_count):
+    """Splits the records of a mapped csv file into about range_count (start, end) byte ranges"""
+    """Returns the end of the header row and the ranges, every range starts and ends on a record boundary"""
+    size = len(mapped)
+    header_end = find_record_end(mapped, 0, 0)
+    boundaries = [header_end]
+    step = (size - header_end) / float(range_count)
+    for part in range(1, range_count):
+        target = header_end + int(step * part)
+        if target <= boundaries[-1]:
+            continue
+        record_end = find_record_end(mapped, target, count_quotes(mapped, boundaries[-1], target))
+        if record_end < size:
+            boundaries.append(record_end)
+    if size > boundaries[-1]:
+        boundaries.append(size)
+    return header_end, list(zip(boundaries[:-1], boundaries[1:]))
+
+def open_record_range(table_path, header_end, start, end):
+    """Opens the header row plus one record range of the table as a text stream for the csv reader"""
+    with open(table_path, 'rb') as table_file:
+        mapped = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            data = mapped[0:header_end] + mapped[start:end]
+        finally:
+            mapped.close()
+    return io.TextIOWrapper(io.BytesIO(data), encoding=locale.getpreferredencoding(False))
+
+def infer_range_worker(table_path, header_end, start, end):
+    """Builds the field definitions for one record range, runs in a worker process"""
+    with open_record_range(table_path, header_end, start, end) as csv_file:
+        reader = csv.reader(csv_file, delimiter=',', quotechar='"')
+        return get_fields(reader)
+
+def merge_range_fields(range_fields):
+    """Combines the field definitions of the record ranges, given in their original order"""
+    """Lengths take the largest range and the type comes from the first range that completed the date test,
+    the same result get_fields gives for the whole table"""
+    fields = {}
+    for current_fields in range_fields:
+        for index, f in current_fields.items():
+            if index not in fields:
+                fields[index] = list(f)
+                continue
+            merged = fields[index]
+            merged[5] = max(merged[5], f[5])
+            if not merged[3] and f[3]:
+                merged[2], merged[3] = f[2], f[3]
+            if merged[4] is not None:
+                merged[4] = merge_numeric_state(merged[4], f[4])
+    finish_fields(fields)
+    return fields
+
+def load_range_worker(table_path, table_name, part, header_end, start, end, fields, scratch_folder):
+    """Loads one record range of the table into the worker's scratch gdb, runs in a worker process"""
+    scratch_gdb = get_worker_gdb(scratch_folder)
+    open_range = functools.partial(open_record_range, table_path, header_end, start, end)
+    return load_table(table_name, open_range, scratch_gdb, fields, "{0}_part{1}".format(table_name, part))
+
+def set_worker_executable():
+    """Inside ArcGIS Pro sys.executable is the application, worker processes need the python executable"""
+    if os.path.basename(sys.executable).lower() not in ["python.exe", "pythonw.exe", "python"]:
+        executable = os.path.join(sys.exec_prefix, "pythonw.exe")
+        if os.path.exists(executable):
+            multiprocessing.set_executable(executable)
+
+def get_worker_gdb(scratch_folder):
+    """Returns the scratch gdb of the current worker process, creating it on first use"""
+    gdb_path = os.path.join(scratch_folder, "worker_{0}.gdb".format(os.getpid()))
+    if not arcpy.Exists(gdb_path):
+        arcpy.CreateFileGDB_management(scratch_folder, os.path.basename(gdb_path))
+    return gdb_path
+
+def load_zip_table_worker(path_to_zip, table_name, member_name, scratch_folder):
+    """Loads a single table of the zip into the worker's scratch gdb, runs in a worker process"""
+    scratch_gdb = get_worker_gdb(scratch_folder)
+    with zipfile.ZipFile(path_to_zip, 'r') as zip_file:
+        member = zip_file.getinfo(member_name)
+        scratch_table = load_table(table_name, functools.partial(open_zip_member, zip_file, member), scratch_gdb)
+    return table_name, scratch_table
+
+def merge_table(scratch_table, out_gdb, out_table_name=None):
+    """Moves a table loaded into a scratch gdb into the output gdb"""
+    outTable = out_gdb + os.sep + (out_table_name or os.path.basename(scratch_table))
+    if arcpy.Exists(outTable):
+        arcpy.AddMessage("  appending: " + os.path.basename(scratch_table))
+        append_to_table(scratch_table, outTable)
+    else:
+        arcpy.AddMessage("  copying: " + os.path.basename(scratch_table))
+        arcpy.Copy_management(scratch_table, outTable)
+
+def load_table(table_name, open_table, out_gdb_path, fields=None, out_table_name=None, rows=None):
+    """Load a single CAMEO table, as a feature class when it is defined in NAMES_OF_SPATIAL_TABLES"""
+    """open_table is called with no arguments and must return a new text stream over the table each time"""
+    """fields and out_table_name are used when loading part of a table that was split across workers"""
+    """fields and rows, the csv rows starting with the header, are used when loading a table merged from several zips"""
+    is_spatial = False
+    latField = None
+    lonField = None
+    if table_name in NAMES_OF_SPATIAL_TABLES: 
+        is_spatial = True
+        latField = NAMES_OF_SPATIAL_TABLES[table_name]['LatField']
+        lonField = NAMES_OF_SPATIAL_TABLES[table_name]['LonField']
+    return create_and_populate_table(out_table_name or table_name, open_table, out_gdb_path, is_spatial, latField, lonField, fields, rows)
+
+def create_and_populate_table(table_name, open_table, out_gdb, is_spatial, lat_field=None, lon_field=None, fields=None, rows=None):
     """Create the output table and populate its values"""
-    with open(table, 'rt') as csv_file:
-        reader = csv.reader(csv_file, delimiter=',', quotechar='"')       
-        fields = get_fields(reader)
-        del(reader)
+    """When the field definitions are given the table is only read to load the rows, or rows are loaded when given"""
+    spool = None
+    header = None
+    cached_fields = None
+    registry_name = table_name
+    if fields is not None:
+        fields = dict((index, list(f)) for index, f in fields.items())
+    else:
+        if SCHEMA_REGISTRY:
+            header = read_header(open_table)
+            cached_fields = lookup_schema(registry_name, header)
+            if cached_fields is not None:
+                arcpy.AddMessage("  Using the registered schema for " + registry_name)
+        if SINGLE_PASS_LOAD:
+            fields, spool = spool_table(open_table, cached_fields)
+        else:
+            with open_table() as csv_file:
+                reader = csv.reader(csv_file, delimiter=',', quotechar='"')       
+                fields = get_fields(reader, cached_fields)
+                del(reader)
 
-    table_name = os.path.basename(table).replace(".csv", "")
     table_name = arcpy.ValidateTableName(table_name, out_gdb)
     outTable = out_gdb + os.sep + table_name
-    if arcpy.Exists(outTable):
+    out_table_exists = arcpy.Exists(outTable)
+    if out_table_exists:
         arcpy.AddMessage("Appending Additional Records to Table: " + str(table_name))
     else:
         arcpy.AddMessage( "Adding Table: " + str(table_name))
 
+    schema_start = time.perf_counter()
+    existing_fields = {}
+    #an incremental update changes the records of the existing table in place, see incremental_rows
+    edit_in_place = INCREMENTAL_UPDATE and out_table_exists
+    if DIRECT_WRITE or edit_in_place:
+        #the final schema is created in the output gdb and the rows are inserted there
+        # when the table exists from a previous zip only the missing fields are added
+        new_table = outTable
+        if out_table_exists:
+            existing_fields = list_table_fields(outTable)
+        else:
+            create_table(out_gdb, table_name, is_spatial)
+    else:
+        new_table = create_table("in_memory", table_name, is_spatial)
+    arcpy.AddMessage("  Table Added: " + out_gdb + os.sep + table_name)
+    arcpy.AddMessage("  Adding new fields...")
+    #field names from the registry were validated when they were registered
+    null_fields = add_fields(new_table, table_name, fields, out_gdb, existing_fields, validate_names=cached_fields is None)
+    arcpy.AddMessage("  Schema set up in {0:.2f}s".format(time.perf_counter() - schema_start))
+    if header is not None:
+        save_schema(registry_name, header, fields)
+
+    #remove any fields with NULL name from fields collection
+    fields = remove_null(fields, null_fields)
+    report_field_lengths(table_name, fields)
+    align_fields(outTable, fields, existing_fields)
+
+    if not is_spatial:
+        lat_field, lon_field = None, None
+    with open_edit_session(out_gdb, edit_in_place):
+        if spool is not None:
+            with spool:
+                add_data(read_spool(spool), new_table, lat_field, lon_field, fields, null_fields)
+        elif rows is not None:
+            add_data(rows, new_table, lat_field, lon_field, fields, null_fields)
+        else:
+            with open_table() as csv_file:
+                reader = csv.reader(csv_file, delimiter=',', quotechar='"')
+                add_data(reader, new_table, lat_field, lon_field, fields, null_fields)
+
+    if DIRECT_WRITE or edit_in_place:
+        return outTable
+
+    #Check to see if table already already exists in output geodatabase
+    #if table exists then append features from input ZIP file
+    #This is to support processing multiple input ZIP files
+    
+    if out_table_exists:
+        append_to_table(new_table, outTable)
+    else:
+        if is_spatial:
+            arcpy.CopyFeatures_management(new_table, outTable)
+        else:
+            arcpy.CopyRows_management(new_table, outTable)
+    
+    arcpy.Delete_management("in_memory")
+    return outTable
+
+def open_edit_session(workspace, enabled=True):
+    """Returns an arcpy.da.Editor for the workspace, the edits are rolled back if the with block raises"""
+    """When not enabled the returned context does nothing"""
+    if not enabled:
+        return contextlib.nullcontext()
+    return arcpy.da.Editor(workspace)
+
+def append_to_table(new_table, outTable):
+    """Adds the fields missing from the existing table and widens the fields that can't hold the new values,
+    then appends the new rows to it"""
+    existing_fields = list_table_fields(outTable)
+    for field in arcpy.ListFields(new_table):
+        if field.type == "OID":
+            continue
+        field_type = FIELD_TYPES_BY_DESCRIBE.get(field.type, field.type)
+        existing_field = existing_fields.get(field.name.lower())
+        if existing_field is None:
+            arcpy.AddField_management(outTable, field.name, field_type, field_length=field.length)
+            continue
+        existing_type = FIELD_TYPES_BY_DESCRIBE.get(existing_field.type)
+        if existing_type is None:
+            continue
+        widened = get_widened_field(existing_type, existing_field.length, field_type, field.length if field_type == "Text" else CONVERTED_TEXT_LENGTH)
+        #a text column without values is empty in the existing field as well
+        if widened is not None and (field_type != "Text" or has_text_values(new_table, field.name)):
+            widen_field(outTable, existing_field, *widened)
+    arcpy.Append_management(new_table,outTable,schema_type="NO_TEST")
+
+def create_table(workspace, table_name, is_spatial):
+    """Creates an empty point feature class or table and returns its path"""
     if is_spatial:
-        new_table = arcpy.CreateFeatureclass_management("in_memory", 
+        result = arcpy.CreateFeatureclass_management(workspace, 
                                                 table_name, 
                                                 "Point", 
                                                 spatial_reference = SPATIAL_REFERENCE)
+        if TUNE_SPATIAL_INDEX and workspace != "in_memory":
+            #the index is built by tune_spatial_indexes once every row is loaded
+            arcpy.RemoveSpatialIndex_management(result.getOutput(0))
     else:
-        new_table = arcpy.CreateTable_management("in_memory", table_name)      
-    arcpy.AddMessage("  Table Added: " + out_gdb + os.sep + table_name)
-    arcpy.AddMessage("  Adding new fields...")
+        result = arcpy.CreateTable_management(workspace, table_name)      
+    return result.getOutput(0)
+
+# ListFields types and the matching AddField_management field type
+FIELD_TYPES_BY_DESCRIBE = {
+    "String" : "Text",
+    "Date" : "Date",
+    "SmallInteger" : "Short",
+    "Integer" : "Long",
+    "Single" : "Float",
+    "Double" : "Double"
+}
+
+# Numeric field types from narrowest to widest, see get_widened_field
+NUMERIC_FIELD_TYPES = ["Short", "Long", "Double"]
+# Characters kept for a number or date when its field is widened to Text
+CONVERTED_TEXT_LENGTH = 30
+
+def list_table_fields(table):
+    """Returns the fields of an existing table keyed by lower case field name"""
+    return dict((field.name.lower(), field) for field in arcpy.ListFields(table))
+
+def add_fields(new_table, table_name, fields, out_gdb, existing_fields=None, validate_names=True):
+    """Validates the field names and adds the fields missing from the table"""
+    """Returns the indexes of the fields that have a NULL name"""
     index = 0
     null_fields = []
-    #fieldsDescriptions = []
+    fieldsDescriptions = []
     for field in fields:
         f = fields[index]
         field_name = str(f[0])
-        field_name = arcpy.ValidateFieldName(field_name, out_gdb)
+        if validate_names:
+            field_name = validate_field_name(field_name, out_gdb)
         f[0] = field_name
         if field_name not in ["", " ", None]:
-            arcpy.AddField_management(new_table,
-                                        field_name,
-                                        field_type = f[2],
-                                        field_length= int(f[1]))
-            #fieldsDescriptions.append([field_name, f[2], f[0], int(f[1])])
+            if not existing_fields or field_name.lower() not in existing_fields:
+                fieldsDescriptions.append([field_name, f[2], int(f[1])])
         else:
             arcpy.AddWarning("{0}: contains a field with a missing name at index {1}".format(table_name, str(index)))
             arcpy.AddWarning("No new field was added for index " + str(index))
             null_fields.append(index)
         index += 1
 
-    #remove any fields with NULL name from fields collection
-    remove_null(fields, null_fields)
-
-    if is_spatial:
-        add_data(table, new_table, lat_field, lon_field, fields, null_fields)
+    if len(fieldsDescriptions) > 0 and hasattr(arcpy.management, "AddFields"):
+        #AddFields (ArcGIS Pro 2.5+) creates every field in a single geoprocessing call
+        arcpy.management.AddFields(new_table,
+                                   [[field_name, field_type.upper(), field_name, field_length]
+                                    for field_name, field_type, field_length in fieldsDescriptions])
     else:
-        add_data(table, new_table, None, None, fields, null_fields)
+        for field_name, field_type, field_length in fieldsDescriptions:
+            arcpy.AddField_management(new_table,
+                                        field_name,
+                                        field_type = field_type,
+                                        field_length= field_length)
+    return null_fields
 
-    #Check to see if table already already exists in output geodatabase
-    #if table exists then append features from input ZIP file
-    #This is to support processing multiple input ZIP files
-    
-    outTable = out_gdb + os.sep + table_name
-    if arcpy.Exists(outTable):
-        existingTableFields = sorted([field.name for field in arcpy.ListFields(outTable)])
-        newTableFields = sorted([field.name for field in arcpy.ListFields(new_table)])
-        #Check to see if any additional fields need to be added to the source table
-        if existingTableFields != newTableFields:
-            fieldListToAdd = [fieldname for fieldname in newTableFields if fieldname not in existingTableFields]
-            fieldsToAdd = [field for field in arcpy.ListFields(new_table) if field.name in fieldListToAdd and field.type != "OID"]
-            for field in fieldsToAdd:
-                arcpy.AddField_management(outTable,field.name,field.type, field_length=field.length)
-        arcpy.Append_management(new_table,outTable,schema_type="NO_TEST")
-    else:
-        if is_spatial:
-            arcpy.CopyFeatures_management(new_table, outTable)
-        else:
-            arcpy.CopyRows_management(new_table, outTable)
-    
-    arcpy.Delete_management("in_memory")
+@functools.lru_cache(maxsize=None)
+def validate_field_name(field_name, workspace):
+    """ValidateFieldName, memoized as the same CAMEO field names repeat across tables and zips"""
+    return arcpy.ValidateFieldName(field_name, workspace)
+
+def align_fields(table, fields, existing_fields):
+    """Matches the field definitions to the fields of an existing table the rows are inserted into"""
+    """Fields whose type or length can't hold the incoming values are widened first, see get_widened_field"""
+    for index, f in fields.items():
+        existing_field = existing_fields.get(f[0].lower())
+        if existing_field is None:
+            continue
+        existing_type = FIELD_TYPES_BY_DESCRIBE.get(existing_field.type)
+        #a column without values takes the type of the existing field
+        if existing_type is not None and f[5] > 0:
+            widened = get_widened_field(existing_type, existing_field.length, f[2], f[5])
+            if widened is not None:
+                existing_field = widen_field(table, existing_field, *widened)
+                existing_type = widened[0]
+        if existing_type is not None:
+            #values are converted to the type of the existing field, Float like Double
+            f[2] = "Double" if existing_type == "Float" else existing_type
+
+def get_widened_field(existing_type, existing_length, incoming_type, incoming_length):
+    """Returns the (type, length) an existing field has to change to so it holds values of the incoming type,
+    None when it already holds them"""
+    """incoming_length is the longest incoming value as text. Text fields are widened to the planned length of the
+    incoming values, numbers Short -> Long -> Double and any other mix of types becomes Text"""
+    existing_type = "Double" if existing_type == "Float" else existing_type
+    incoming_type = "Double" if incoming_type == "Float" else incoming_type
+    if existing_type == "Text":
+        if existing_length < incoming_length:
+            return "Text", plan_field_length(incoming_length)
+        return None
+    if existing_type == incoming_type:
+        return None
+    if existing_type in NUMERIC_FIELD_TYPES and incoming_type in NUMERIC_FIELD_TYPES:
+        if NUMERIC_FIELD_TYPES.index(incoming_type) > NUMERIC_FIELD_TYPES.index(existing_type):
+            return incoming_type, existing_length
+        return None
+    #leading zeros, identifiers and dates would be lost or set to NULL in a number or date field
+    return "Text", plan_field_length(max(incoming_length, CONVERTED_TEXT_LENGTH))
 
-def add_data(table, new_table, field_lat=None, field_lon=None, fields=None, null_fields=None):
+def widen_field(table, field, field_type, field_length):
+    """Changes an existing field to the given type and length by copying its values into a new field"""
+    """The field moves to the end of the table and loses its attribute index, create_indexes adds it back.
+    Returns the new field"""
+    arcpy.AddWarning("  {0}: changing field {1} from {2} to {3} to hold the new values".format(
+        os.path.basename(table), field.name, FIELD_TYPES_BY_DESCRIBE.get(field.type, field.type),
+        "Text({0})".format(field_length) if field_type == "Text" else field_type))
+    temp_name = validate_field_name(field.name[:50] + "_widened", os.path.dirname(table))
+    arcpy.AddField_management(table, temp_name, field_type, field_length=field_length, field_alias=field.aliasName)
+    to_text = field_type == "Text" and FIELD_TYPES_BY_DESCRIBE.get(field.type) != "Text"
+    with arcpy.da.UpdateCursor(table, [field.name, temp_name]) as cursor:
+        for value, widened_value in cursor:
+            cursor.updateRow([value, format_text(value) if to_text and value is not None else value])
+    arcpy.DeleteField_management(table, field.name)
+    arcpy.AlterField_management(table, temp_name, field.name, field.aliasName)
+    return list_table_fields(table)[field.name.lower()]
+
+def format_text(value):
+    """Returns the value of a number or date field as text for a field widened to Text"""
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%m/%d/%Y")
+    if isinstance(value, float):
+        return "{0:.15g}".format(value)
+    return str(value)
+
+def has_text_values(table, field_name):
+    """Checks if a text field holds a value that isn't empty"""
+    where_clause = "{0} IS NOT NULL AND {0} <> ''".format(arcpy.AddFieldDelimiters(table, field_name))
+    with arcpy.da.SearchCursor(table, [field_name], where_clause) as cursor:
+        return next(iter(cursor), None) is not None
+
+def add_data(reader, new_table, field_lat=None, field_lon=None, fields=None, null_fields=None):
     """Reads data from csv and writes to the new gdb table""" 
     """Handles tables or tables with shape if lat and lon fields are provided"""
-    field_name_list = list(list(zip(*list(fields.values())))[0])
+    """reader yields the csv rows, starting with the row of column headers"""
+    field_name_list = [fields[index][0] for index in sorted(fields)]
     is_spatial = False
     if field_lat != None and field_lon != None:
         is_spatial = True
-        field_name_list.append("SHAPE@")
-    lat_index = -1
-    lon_index = -1
+        field_name_list.append("SHAPE@XY")
     arcpy.AddMessage("  Importing data...")
-    row_index = 0
-    with open(table, 'rt') as csv_file:
-        reader = csv.reader(csv_file, delimiter=',', quotechar='"')  
-        with arcpy.da.InsertCursor(new_table, field_name_list) as cursor:  
-            first_row = True
-            for row in reader:
-                row_index += 1 
-                if len(null_fields) > 0:
-                    remove_null(row, null_fields)
-                has_xy = False
-                new_row = None
-                #first row has column headers
-                if first_row:
-                    first_row = False
-                    #if this is the spatial data then get the index for the
-                    # lat and lon fields so we can use these in the geom we create
-                    if is_spatial:
-                        if lat_index < 0 and lon_index < 0:
-                            index = 0
-                            for value in row:
-                                if str(value) == field_lat:
-                                    lat_index = index
-                                if str(value) == field_lon:
-                                    lon_index = index
-                                index += 1
-                else:
-                    xx = 0
-                    error_row = True if len(row) != len(fields) else False
-                    for value in row:
-                        if error_row and xx == len(fields):
-                            arcpy.AddWarning("Row: {0} in {1} contains more values than fields".format(str(row_index), csv_file)) 
-                            arcpy.AddWarning(row)
-                            while xx < len(row):
-                                del row[-1]
-                            break
-                        #remove non ascii if any
-                        new_value = ''.join([i if ord(i) < 128 else '' for i in str(value)])
-                        #if this changes the string then update the row
-                        if new_value != value:
-                            if new_row != None:
-                                new_row[xx] = new_value
-                            else:
-                                row[xx] = new_value
-                        if fields[xx][2] == "Date":
-                            #check for valid date value
-                            if not check_date(new_value)[0]:
-                                #set default if valid date not found
-                                if new_row != None:
-                                    new_row[xx] = None
-                                else:
-                                    row[xx] = None
-                        if is_spatial and not has_xy:
-                            #row is from our reader...create a new row to append the new shape
-                            if row[lat_index] in ["", None] or row[lon_index] in ["", None] or not check_float(row[lon_index]) or not check_float(row[lat_index]):
-                                row[lat_index], row[lon_index] = 0, 0
-                            new_row = list(row)
-                            new_row.append([float(row[lon_index]), float(row[lat_index])])
-                            has_xy = True
-                        xx+=1
-                    if new_row:
-                        cursor.insertRow(new_row)
-                    else:
-                        cursor.insertRow(row)
-        arcpy.AddMessage("-"*50)
+    #first row has column headers
+    header = next(reader, None)
+    if header is not None:
+        row_length = len(header)
+        convert_row = build_row_converter(header, fields, null_fields, field_lat, field_lon)
+        rows = (convert_row(row if len(row) == row_length else fit_row(row, row_length, row_index, new_table))
+                for row_index, row in enumerate(reader, 2))
+        if use_bulk_insert(header, fields, field_lat, field_lon):
+            bulk_insert_rows(rows, new_table, field_name_list, fields, is_spatial)
+        else:
+            with arcpy.da.InsertCursor(new_table, field_name_list) as cursor:  
+                for values in rows:
+                    cursor.insertRow(values)
+    arcpy.AddMessage("-"*50)
+
+def use_bulk_insert(header, fields, field_lat=None, field_lon=None):
+    """Checks if the table can be written with the NumPy bulk path"""
+    if not BULK_INSERT:
+        return False
+    if numpy is None:
+        arcpy.AddWarning("  NumPy is not available, using insert cursor")
+        return False
+    if INCREMENTAL_UPDATE:
+        #the chunks are appended with a geoprocessing tool, which can't run in the edit session of the update
+        arcpy.AddMessage("  Incremental updates use the insert cursor")
+        return False
+    unsupported = sorted(set(f[2] for f in fields.values() if f[2] not in BULK_FIELD_TYPES))
+    if len(unsupported) > 0:
+        arcpy.AddMessage("  Bulk insert does not support {0} fields, using insert cursor".format(", ".join(unsupported)))
+        return False
+    if field_lat != None and field_lon != None and (field_lat not in header or field_lon not in header):
+        return False
+    return True
+
+def bulk_insert_rows(rows, new_table, field_name_list, fields, is_spatial):
+    """Writes the converted rows to the table in chunks of BULK_CHUNK_SIZE rows"""
+    field_types = [fields[index][2] for index in sorted(fields)]
+    chunk = []
+    for values in rows:
+        chunk.append(values)
+        if len(chunk) == BULK_CHUNK_SIZE:
+            write_bulk_chunk(chunk, new_table, field_name_list, field_types, is_spatial)
+            chunk = []
+    if len(chunk) > 0:
+        write_bulk_chunk(chunk, new_table, field_name_list, field_types, is_spatial)
+
+def write_bulk_chunk(chunk, new_table, field_name_list, field_types, is_spatial):
+    """Converts a chunk of rows to a NumPy structured array and appends it to the table"""
+    if is_spatial:
+        #replace the SHAPE@XY token with x/y columns
+        records = [tuple(values[:-1]) + tuple(values[-1]) for values in chunk]
+        names = field_name_list[:-1] + BULK_SHAPE_FIELDS
+        field_types = field_types + ["Shape", "Shape"]
+    else:
+        records = [tuple(values) for values in chunk]
+        names = field_name_list
+    dtype = []
+    columns = []
+    for index, name in enumerate(names):
+        column = [record[index] for record in records]
+        field_dtype = "<f8" if field_types[index] == "Shape" else BULK_FIELD_TYPES[field_types[index]]
+        if field_dtype == "U":
+            field_dtype = "<U{0}".format(max(1, max(map(len, column))))
+        elif field_dtype in ("<i2", "<i4") and None in column:
+            #integers have no null, the staged Double column is appended with NULL for NaN
+            field_dtype = "<f8"
+        if field_dtype == "<f8":
+            column = [numpy.nan if value is None else value for value in column]
+        dtype.append((str(name), field_dtype))
+        columns.append(column)
+    del records
+    chunk_array = numpy.empty(len(chunk), dtype=dtype)
+    for (name, field_dtype), column in zip(dtype, columns):
+        chunk_array[name] = numpy.array(column, dtype=field_dtype)
+    del columns
+
+    chunk_table = os.path.join('in_memory', 'bulk_chunk')
+    if is_spatial:
+        arcpy.da.NumPyArrayToFeatureClass(chunk_array, chunk_table, BULK_SHAPE_FIELDS, SPATIAL_REFERENCE)
+    else:
+        arcpy.da.NumPyArrayToTable(chunk_array, chunk_table)
+    arcpy.Append_management(chunk_table, new_table, schema_type="NO_TEST")
+    arcpy.Delete_management(chunk_table)
+
+def fit_row(row, row_length, row_index, table):
+    """Trims a row with more values than fields or pads a row with fewer values"""
+    if len(row) > row_length:
+        arcpy.AddWarning("Row: {0} in {1} contains more values than fields".format(str(row_index), table)) 
+        arcpy.AddWarning(row)
+        return row[:row_length]
+    return row + [""] * (row_length - len(row))
 
 def main():
     arcpy.env.overwriteOutput = True
@@ -574,24 +2474,59 @@ def main():
     ##Example Usage: "testDataOutput"
     gdb_name = arcpy.GetParameterAsText(2)
   
+    if INCREMENTAL_UPDATE and not READ_TABLES_FROM_ZIP:
+        arcpy.AddError("INCREMENTAL_UPDATE requires READ_TABLES_FROM_ZIP")
+        raise ValueError("INCREMENTAL_UPDATE requires READ_TABLES_FROM_ZIP")
+
     #create the output workspace
     out_gdb_path = create_output_gdb(out_workspace_path, gdb_name)
 
     #import the data into gdb tables
-    for zip_path in zip_paths:
-        #extract the zip file
-        extracted_file_location = extract_zip(zip_path)
-        #convert to .mer files to GDB tables
-        tables_to_gdb(extracted_file_location, out_gdb_path)
+    # with a single worker process every zip is read by one pipeline that parses ahead of the inserts
+    read_zips_together = READ_TABLES_FROM_ZIP and (WORKERS == 1 or INCREMENTAL_UPDATE or (MERGE_ZIPS and len(zip_paths) > 1))
+    if read_zips_together:
+        zips_to_gdb(zip_paths, out_gdb_path)
+    #the tables are read from the zip so only the attachments need to be written to disk
+    attachments_from_zip = READ_TABLES_FROM_ZIP and ATTACHMENTS_FROM_ZIP
+    extract_zips = not READ_TABLES_FROM_ZIP or (product_info != 'ArcView' and not attachments_from_zip)
+    attachment_cache = open_attachment_cache() if attachments_from_zip and product_info != 'ArcView' else None
+    #each zip is extracted to its own folder, the next zip while the current one is processed
+    for zip_path, extracted_file_location in prefetch_extractions(zip_paths, READ_TABLES_FROM_ZIP, extract_zips):
+        if READ_TABLES_FROM_ZIP:
+            if not read_zips_together:
+                zip_tables_to_gdb(zip_path, out_gdb_path)
+        else:
+            #convert to .mer files to GDB tables
+            tables_to_gdb(extracted_file_location, out_gdb_path)
         if product_info != 'ArcView':
-            #add the attachments
-            add_attachments(extracted_file_location, out_gdb_path)
-            #remove attachmnet folder from directory after attachment to GDB
-            remove_attachment_folder(extracted_file_location, out_gdb_path)
+            if attachments_from_zip:
+                #add the attachments straight from the zip
+                with zipfile.ZipFile(zip_path, 'r') as zip_file:
+                    add_attachments(None, out_gdb_path, zip_file, attachment_cache)
+            else:
+                #add the attachments
+                add_attachments(extracted_file_location, out_gdb_path)
+                #remove attachmnet folder from directory after attachment to GDB
+                remove_attachment_folder(extracted_file_location, out_gdb_path)
+    close_attachment_cache(attachment_cache)
+
+    if INTEGRITY_CHECK:
+        #check the child keys resolve before the relationship classes are built on them
+        check_integrity(RELATIONSHIPS, out_gdb_path)
+
+    discovered = []
+    if RELATIONSHIP_DISCOVERY is not None:
+        discovered = discover_relationships(RELATIONSHIPS, out_gdb_path)
 
     if product_info != 'ArcView':
         #create appropriate relationship classes
-        create_relationship_classes(RELATIONSHIPS)
+        create_relationship_classes(RELATIONSHIPS, discovered if RELATIONSHIP_DISCOVERY == "create" else [])
+
+    if CREATE_INDEXES:
+        create_indexes(out_gdb_path)
+
+    if TUNE_SPATIAL_INDEX:
+        tune_spatial_indexes(out_gdb_path)
 
     #Set Derived Parameter Values
     # derived values are added to the map
@@ -600,7 +2535,7 @@ def main():
 
     out_tables = arcpy.ListTables()
 
-    out_tables = ";".join([out_gdb_path + os.sep + table for table in out_tables if "__ATTACH" not in table])
+    out_tables = ";".join([out_gdb_path + os.sep + table for table in out_tables if "__ATTACH" not in table and table not in [RECORD_HASH_TABLE, ATTACHMENT_LINK_TABLE, INTEGRITY_REPORT_TABLE]])
 
     out_FCs = arcpy.ListFeatureClasses()
 
@@ -0,0 +1,137 @@
+import os
+import sys
+import csv
+import time
+import random
+import datetime
+import tempfile
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(testDir, "..", "source")))
+
+import ImportCameo
+
+benchmarkRows = 100000
+
+facilityFields = [
+    'FacilityRecordID',
+    'FacilityName',
+    'FStreetAddress',
+    'FCity',
+    'FState',
+    'FZip',
+    'FCounty',
+    'FDateModified',
+    'DateSigned',
+    'Latitude',
+    'Longitude',
+    'MaxNumOccupants',
+    'FeesTotal',
+    'ReportYear',
+    'FNotes'
+]
+
+def write_facilities(path, rowCount):
+    """Writes a synthetic Facilities.mer with a mix of ascii/non ascii text, dates and coordinates"""
+    random.seed(42)
+    with open(path, 'w', newline='') as csvFile:
+        writer = csv.writer(csvFile)
+        writer.writerow(facilityFields)
+        for i in range(rowCount):
+            writer.writerow([
+                'FAC{:08d}'.format(i),
+                'Facility {}'.format(i) if i % 50 else 'Café {}'.format(i),
+                '{} Main St'.format(i),
+                'Redlands',
+                'CA',
+                '92373',
+                'San Bernardino',
+                '{}/{}/2019'.format(random.randint(1, 12), random.randint(1, 28)),
+                '' if i % 3 else '01/15/19',
+                '' if i % 97 == 0 else '{:.6f}'.format(random.uniform(32, 42)),
+                '{:.6f}'.format(random.uniform(-124, -114)),
+                str(random.randint(0, 500)),
+                '{:.2f}'.format(random.uniform(0, 1000)),
+                '2019',
+                'Notes for facility {}'.format(i) * (i % 4)
+            ])
+
+def legacy_check_date(value):
+    """The strptime trial and error check_date used before the cached date parser"""
+    is_date = False
+    test_complete = False
+    if value != "":
+        test_complete = True
+        if len(value.split("/")) == 3:
+            for format in ["%m/%d/%y", "%m/%d/%Y"]:
+                try:
+                    datetime.datetime.strptime(value, format)
+                    is_date = True
+                    break
+                except:
+                    is_date = False
+    return is_date, test_complete
+
+def legacy_convert_rows(reader, fields, latIndex, lonIndex):
+    """The per value conversion loop add_data used before the row converters"""
+    def check_float(value):
+        try:
+            float(value)
+            return True
+        except ValueError:
+            return False
+    next(reader)
+    for row in reader:
+        has_xy = False
+        new_row = None
+        xx = 0
+        for value in row:
+            new_value = ''.join([i if ord(i) < 128 else '' for i in str(value)])
+            if new_value != value:
+                if new_row != None:
+                    new_row[xx] = new_value
+                else:
+                    row[xx] = new_value
+            if fields[xx][2] == "Date":
+                if not legacy_check_date(new_value)[0]:
+                    if new_row != None:
+                        new_row[xx] = None
+                    else:
+                        row[xx] = None
+            if not has_xy:
+                if row[latIndex] in ["", None] or row[lonIndex] in ["", None] or not check_float(row[lonIndex]) or not check_float(row[latIndex]):
+                    row[latIndex], row[lonIndex] = 0, 0
+                new_row = list(row)
+                new_row.append([float(row[lonIndex]), float(row[latIndex])])
+                has_xy = True
+            xx += 1
+        yield new_row
+
+def converter_rows(reader, fields):
+    """The precompiled row converters used by add_data"""
+    ImportCameo.parse_date.cache_clear()
+    header = next(reader)
+    convert_row = ImportCameo.build_row_converter(header, fields, [], 'Latitude', 'Longitude')
+    for row in reader:
+        yield convert_row(row)
+
+def time_rows(label, path, convert):
+    with open(path, 'rt') as csvFile:
+        start = time.perf_counter()
+        count = sum(1 for row in convert(csv.reader(csvFile)))
+        elapsed = time.perf_counter() - start
+    print("{}: {} rows in {:.2f}s | {:,.0f} rows/sec".format(label, count, elapsed, count / elapsed))
+    return count / elapsed
+
+with tempfile.TemporaryDirectory() as tempDir:
+    facilitiesPath = os.path.join(tempDir, "Facilities.mer")
+    write_facilities(facilitiesPath, benchmarkRows)
+    with open(facilitiesPath, 'rt') as csvFile:
+        fields = ImportCameo.get_fields(csv.reader(csvFile))
+    latIndex = facilityFields.index('Latitude')
+    lonIndex = facilityFields.index('Longitude')
+
+    print("Row conversion benchmark for a synthetic Facilities table************")
+    before = time_rows("Before (per value loop)", facilitiesPath, lambda reader: legacy_convert_rows(reader, fields, latIndex, lonIndex))
+    after = time_rows("After (row converters)", facilitiesPath, lambda reader: converter_rows(reader, fields))
+    print("Speedup: {:.1f}x".format(after / before))
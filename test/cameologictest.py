@@ -0,0 +1,256 @@
+import os
+import sys
+import csv
+import mmap
+import array
+import random
+import tempfile
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(testDir, "..", "source")))
+
+import ImportCameo
+
+def write_table(path, rowCount):
+    """Writes a csv table with quoted newlines, escaped quotes, dates and numbers"""
+    random.seed(7)
+    rows = [['RecordID', 'Name', 'Notes', 'DateModified', 'Count', 'Amount']]
+    for i in range(rowCount):
+        rows.append([
+            'REC{:06d}'.format(i),
+            'Name "{}"'.format(i) if i % 7 == 0 else 'Name {}'.format(i),
+            'line one\nline "two"\r\nline three' if i % 5 == 0 else ('x' * random.randint(0, 80)),
+            '{}/{}/2019'.format(random.randint(1, 12), random.randint(1, 28)) if i % 3 else '',
+            str(random.randint(-500, 70000)),
+            '{:.2f}'.format(random.uniform(0, 1000)) if i % 11 else ''
+        ])
+    with open(path, 'w', newline='') as csvFile:
+        csv.writer(csvFile).writerows(rows)
+    #the tables are read in text mode, so the quoted \r\n come back as \n like they do for the whole table
+    with open(path, 'rt') as csvFile:
+        return list(csv.reader(csvFile))
+
+def record_range_tests(tablePath, rows):
+    errorCount = 0
+    print('Record Range Tests***************************************************')
+    with open(tablePath, 'rt') as csvFile:
+        expectedFields = ImportCameo.get_fields(csv.reader(csvFile))
+    with open(tablePath, 'rb') as tableFile:
+        mapped = mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for rangeCount in [1, 2, 3, 7, 50, 1000]:
+                headerEnd, ranges = ImportCameo.index_record_ranges(mapped, rangeCount)
+                parsedRows = [rows[0]]
+                for start, end in ranges:
+                    with ImportCameo.open_record_range(tablePath, headerEnd, start, end) as rangeFile:
+                        rangeRows = list(csv.reader(rangeFile))
+                    test1 = rangeRows[0] == rows[0]
+                    if test1 == False:
+                        print("Range {}-{} does not start with the header".format(start, end))
+                        errorCount += 1
+                    parsedRows.extend(rangeRows[1:])
+                test2 = parsedRows == rows
+                print("{} ranges ({} made) parse back to the same rows: {}".format(rangeCount, len(ranges), test2))
+
+                rangeFields = [ImportCameo.infer_range_worker(tablePath, headerEnd, start, end) for start, end in ranges]
+                test3 = ImportCameo.merge_range_fields(rangeFields) == expectedFields
+                print("{} ranges merged fields equal get_fields: {}".format(rangeCount, test3))
+
+                for test in [test2, test3]:
+                    if test == False:
+                        errorCount += 1
+        finally:
+            mapped.close()
+
+    #a boundary right after an escaped quote or inside a quoted newline has to move to the next record
+    data = b'A,B\n"x ""quoted""\ny",1\n"a\nb",2\nc,3\n'
+    test4 = all(ImportCameo.find_record_end(data, position, ImportCameo.count_quotes(data, 4, position)) == (23 if position < 23 else 31)
+                for position in range(5, 31))
+    print("Record ends skip quoted newlines and escaped quotes: {}".format(test4))
+    if test4 == False:
+        errorCount += 1
+    return errorCount
+
+def kept_rows_tests():
+    errorCount = 0
+    print('\nKept Rows Tests******************************************************')
+    #(key, date ordinal) of each row in zip order, -1 is a row without a key
+    rows = [(1, 10), (2, 5), (1, 12), (3, 7), (-1, 0), (2, 5), (1, 11), (-1, 0), (3, 6), (4, 0), (4, 0)]
+    #key 1: the newest date wins, key 2 and 4: the same date so the later row wins, rows without a key are kept
+    expected = bytearray([0, 0, 1, 1, 1, 1, 0, 1, 0, 0, 1])
+    keys = array.array('q', [key for key, date in rows])
+    dates = array.array('q', [date for key, date in rows])
+    numpyModule = ImportCameo.numpy
+    for label, module in [("NumPy", numpyModule), ("dict", None)]:
+        if label == "NumPy" and module is None:
+            print("NumPy is not available, skipping the NumPy path")
+            continue
+        ImportCameo.numpy = module
+        try:
+            test1 = ImportCameo.find_kept_rows(keys, dates) == expected
+        finally:
+            ImportCameo.numpy = numpyModule
+        print("Newest row of each key kept, ties to the later zip ({} path): {}".format(label, test1))
+        if test1 == False:
+            errorCount += 1
+    return errorCount
+
+def type_inference_tests():
+    errorCount = 0
+    print('\nType Inference Tests*************************************************')
+    integer = lambda minimum, maximum: ['Integer', minimum, maximum]
+    double = ['Double', None, None]
+    text = ['Text', None, None]
+    #(column batch, expected [kind, minimum, maximum]) checked against the NumPy and pure python classifiers
+    classifyCases = [
+        (['1', '2', '-30', ''], integer(-30, 2)),
+        (['', ''], [None, None, None]),
+        (['1.5', '2'], double),
+        (['+5', '-0.25', '1e5'], double),
+        (['0.5', '0'], double),
+        #leading zeros are zip codes and phone numbers
+        (['007'], text),
+        (['-05'], text),
+        (['123456789012345678'], integer(123456789012345678, 123456789012345678)),
+        #more than 18 digits doesn't fit a 64 bit integer
+        (['1234567890123456789'], text),
+        (['1234567890123456789', '1.5'], text),
+        #beyond the Long range merged with a Double would lose digits
+        (['3000000000', '1.5'], text),
+        (['1.5', '3000000000'], text),
+        (['3000000000'], integer(3000000000, 3000000000)),
+        (['1e999'], text),
+        (['abc', '1'], text),
+        (['1.2.3'], text),
+        (['-'], text)
+    ]
+    for label, classify in [("NumPy", ImportCameo.classify_values), ("python", ImportCameo.classify_values_python)]:
+        if label == "NumPy" and ImportCameo.numpy is None:
+            print("NumPy is not available, skipping the NumPy path")
+            continue
+        failed = [(values, expected, classify(values)) for values, expected in classifyCases if classify(values) != expected]
+        for values, expected, actual in failed:
+            print("  {} classified as {}, expected {}".format(values, actual, expected))
+        test1 = len(failed) == 0
+        print("Column batches classified ({} path): {}".format(label, test1))
+        if test1 == False:
+            errorCount += 1
+
+    fieldTypeCases = [
+        (integer(-32768, 32767), 'Short'),
+        (integer(-32769, 0), 'Long'),
+        (integer(0, 32768), 'Long'),
+        (integer(-2147483648, 2147483647), 'Long'),
+        (integer(0, 2147483648), 'Text'),
+        (double, 'Double'),
+        (text, 'Text')
+    ]
+    test2 = all(ImportCameo.numeric_field_type(state) == expected for state, expected in fieldTypeCases)
+    print("Numeric states map to the smallest field type: {}".format(test2))
+
+    mergeCases = [
+        ([None, None, None], integer(1, 2), integer(1, 2)),
+        (integer(-5, 3), integer(0, 40000), integer(-5, 40000)),
+        (integer(1, 2), double, double),
+        (double, integer(1, 2), double),
+        (integer(1, 3000000000), double, text),
+        (double, integer(-3000000000, 1), text),
+        (text, integer(1, 2), text)
+    ]
+    test3 = all(ImportCameo.merge_numeric_state(state, other) == expected for state, other, expected in mergeCases)
+    print("Numeric states merge across batches: {}".format(test3))
+
+    convertedLength = ImportCameo.plan_field_length(ImportCameo.CONVERTED_TEXT_LENGTH)
+    #(existing type, existing length, incoming type, incoming length, expected (type, length) or None)
+    widenCases = [
+        ('Short', 2, 'Long', 6, ('Long', 2)),
+        ('Short', 2, 'Double', 6, ('Double', 2)),
+        ('Long', 4, 'Short', 3, None),
+        ('Double', 8, 'Long', 6, None),
+        ('Float', 4, 'Double', 6, None),
+        ('Date', 8, 'Date', 10, None),
+        ('Long', 4, 'Text', 12, ('Text', convertedLength)),
+        ('Date', 8, 'Short', 3, ('Text', convertedLength)),
+        ('Text', 10, 'Text', 50, ('Text', ImportCameo.plan_field_length(50))),
+        ('Text', 100, 'Text', 50, None),
+        ('Text', 100, 'Long', 6, None)
+    ]
+    test4 = all(ImportCameo.get_widened_field(*case[:4]) == case[4] for case in widenCases)
+    print("Existing fields are widened to hold the incoming values: {}".format(test4))
+
+    for test in [test2, test3, test4]:
+        if test == False:
+            errorCount += 1
+    return errorCount
+
+def containment_tests():
+    errorCount = 0
+    print('\nContainment Tests****************************************************')
+    random.seed(25)
+    parentKeys = ['FAC{:08d}'.format(i) for i in range(20000)]
+    otherKeys = ['OTH{:08d}'.format(i) for i in range(20000)]
+    parentCount, parentSketch, parentUnique = ImportCameo.sketch_key_values([(key,) for key in parentKeys], 1)[0]
+    #the set read by read_key_hashes when too few child hashes fall in the range of the parent sketch
+    parentHashes = set(ImportCameo.hash_key_value(key) for key in parentKeys)
+    test1 = parentCount == 20000 and parentUnique and len(parentSketch) == ImportCameo.DISCOVERY_SKETCH_SIZE
+    print("Parent sketch holds the smallest hashes of a unique key: {}".format(test1))
+    if test1 == False:
+        errorCount += 1
+
+    #(label, child keys, contained, estimated from the parent sketch)
+    cases = [
+        ("50 contained keys", random.sample(parentKeys, 50), True, False),
+        ("500 contained keys", random.sample(parentKeys, 500), True, False),
+        ("5000 contained keys", random.sample(parentKeys, 5000), True, True),
+        ("50 half contained keys", random.sample(parentKeys, 25) + random.sample(otherKeys, 25), False, False),
+        ("5000 half contained keys", random.sample(parentKeys, 2500) + random.sample(otherKeys, 2500), False, True)
+    ]
+    for label, childKeys, contained, estimated in cases:
+        childSketch = ImportCameo.sketch_key_values([(key,) for key in childKeys], 1)[0][1]
+        containment = ImportCameo.estimate_containment(childSketch, parentSketch)
+        test2 = (containment is not None) == estimated
+        if containment is None:
+            containment = ImportCameo.estimate_containment(childSketch, parentHashes)
+        test3 = (containment >= ImportCameo.DISCOVERY_CONTAINMENT) == contained
+        print("{}: {} from the {} | {:.0%} contained | {}".format(label, "estimated" if estimated else "compared",
+            "parent sketch" if estimated else "parent hashes", containment, test2 and test3))
+        for test in [test2, test3]:
+            if test == False:
+                errorCount += 1
+    return errorCount
+
+def record_hash_tests():
+    errorCount = 0
+    print('\nRecord Hash Tests****************************************************')
+    header = ['FacilityRecordID', 'FacilityName', 'FCity', 'FNotes', 'FDateModified']
+    row = ['FAC1', 'Facility 1', 'Redlands', '', '1/2/2019']
+    recordHash = ImportCameo.get_record_hash(header, row)
+    order = [3, 0, 4, 2, 1]
+    test1 = ImportCameo.get_record_hash([header[i] for i in order], [row[i] for i in order]) == recordHash
+    print("Record hash is the same when the columns are reordered: {}".format(test1))
+    #a column that is empty or missing from tonight's export doesn't change the hash
+    test2 = ImportCameo.get_record_hash(header[:3] + header[4:], row[:3] + row[4:]) == recordHash
+    print("Record hash ignores empty columns: {}".format(test2))
+    test3 = ImportCameo.get_record_hash(header, row[:2] + ['Yucaipa'] + row[3:]) != recordHash
+    print("Record hash changes with a value: {}".format(test3))
+    #the same values under swapped column names are a different record
+    test4 = ImportCameo.get_record_hash(['FCity', 'FacilityName'], ['Facility 1', 'Redlands']) != \
+        ImportCameo.get_record_hash(['FacilityName', 'FCity'], ['Facility 1', 'Redlands'])
+    print("Record hash depends on which column holds a value: {}".format(test4))
+    for test in [test1, test2, test3, test4]:
+        if test == False:
+            errorCount += 1
+    return errorCount
+
+totalErrors = 0
+with tempfile.TemporaryDirectory() as tempDir:
+    tablePath = os.path.join(tempDir, "Records.mer")
+    tableRows = write_table(tablePath, 5000)
+    totalErrors += record_range_tests(tablePath, tableRows)
+totalErrors += type_inference_tests()
+totalErrors += kept_rows_tests()
+totalErrors += record_hash_tests()
+totalErrors += containment_tests()
+
+if totalErrors > 0:
+    sys.exit(1)
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import random
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(testDir, "..", "source")))
+
+import arcpy
+import ImportCameo
+
+queryCount = 200
+searchDistance = "5000 Meters"
+
+def copy_feature_class(source, out_name, grid_size):
+    """Copies the feature class into the scratch gdb and indexes it with the grid size"""
+    copy = arcpy.CopyFeatures_management(source, os.path.join(arcpy.env.scratchGDB, out_name))[0]
+    ImportCameo.build_spatial_index(copy, grid_size)
+    return copy
+
+def sample_points(feature_class, count):
+    """Returns seeded random points from the non 0,0 features of the feature class"""
+    with arcpy.da.SearchCursor(feature_class, ["SHAPE@XY"]) as cursor:
+        points = [xy for xy, in cursor if xy is not None and xy != (0.0, 0.0)]
+    random.seed(42)
+    return [random.choice(points) for i in range(count)] if points else []
+
+def extent_query(layer, points, half_width, spatial_reference):
+    """Selects the features in a window around each point"""
+    for x, y in points:
+        window = arcpy.Extent(x - half_width, y - half_width, x + half_width, y + half_width).polygon
+        window = arcpy.Polygon(window.getPart(), spatial_reference)
+        arcpy.SelectLayerByLocation_management(layer, "INTERSECT", window)
+
+def nearest_query(layer, points, spatial_reference):
+    """Finds the nearest feature to each point from the features within the search distance"""
+    for x, y in points:
+        point = arcpy.PointGeometry(arcpy.Point(x, y), spatial_reference)
+        arcpy.SelectLayerByLocation_management(layer, "WITHIN_A_DISTANCE", point, searchDistance)
+        with arcpy.da.SearchCursor(layer, ["SHAPE@"]) as cursor:
+            min((row[0].distanceTo(point) for row in cursor), default=None)
+
+def time_queries(label, feature_class, points, half_width):
+    spatial_reference = arcpy.Describe(feature_class).spatialReference
+    layer = arcpy.MakeFeatureLayer_management(feature_class, label.replace(" ", "_"))[0]
+    start = time.perf_counter()
+    extent_query(layer, points, half_width, spatial_reference)
+    extent_time = time.perf_counter() - start
+    start = time.perf_counter()
+    nearest_query(layer, points, spatial_reference)
+    nearest_time = time.perf_counter() - start
+    arcpy.Delete_management(layer)
+    print("  {}: extent {:.2f}s | nearest {:.2f}s".format(label, extent_time, nearest_time))
+    return extent_time, nearest_time
+
+if len(sys.argv) < 2:
+    print("Usage: cameospatialbenchmark.py <path to an imported Cameo gdb>")
+    sys.exit(1)
+
+outGdb = sys.argv[1]
+print("Spatial index benchmark for {}************".format(outGdb))
+for tableName in ImportCameo.NAMES_OF_SPATIAL_TABLES:
+    source = os.path.join(outGdb, tableName)
+    if not arcpy.Exists(source):
+        continue
+    gridSize, pointCount = ImportCameo.get_spatial_grid_size(source)
+    points = sample_points(source, queryCount)
+    if not points or gridSize == 0:
+        print("{}: not enough points to benchmark".format(tableName))
+        continue
+    print("{}: {} points, tuned grid size {:.6f}".format(tableName, pointCount, gridSize))
+    before = time_queries("Before (default grid)", copy_feature_class(source, tableName + "_default", 0), points, gridSize)
+    after = time_queries("After (tuned grid)", copy_feature_class(source, tableName + "_tuned", gridSize), points, gridSize)
+    print("  Speedup: extent {:.1f}x | nearest {:.1f}x".format(before[0] / after[0], before[1] / after[1]))
+    arcpy.Delete_management(os.path.join(arcpy.env.scratchGDB, tableName + "_default"))
+    arcpy.Delete_management(os.path.join(arcpy.env.scratchGDB, tableName + "_tuned"))
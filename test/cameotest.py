@@ -1,8 +1,12 @@
 import os
+import sys
 import arcpy
 import collections
 
 testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(testDir, "..", "source")))
+
+import ImportCameo
 
 toolBoxPath = os.path.abspath(os.path.join(testDir, "..", "source", "CAMEO Tools.tbx"))
 
@@ -1633,6 +1637,34 @@ def functional_tests(testSuite):
     
     return errorCount
 
+def incremental_tests(testSuite):
+    errorCount = 0
+    print("INCREMENTAL TESTS for {} Test Suite**********************************".format(testSuite['GDBName']))
+    sources = testSuite['source'] if isinstance(testSuite['source'], list) else [testSuite['source']]
+    #without DIRECT_WRITE the tables of a fresh gdb are loaded in_memory and copied, there is nothing to delete yet
+    settings = (ImportCameo.INCREMENTAL_UPDATE, ImportCameo.DIRECT_WRITE)
+    ImportCameo.INCREMENTAL_UPDATE, ImportCameo.DIRECT_WRITE = True, False
+    try:
+        outGdb = ImportCameo.create_output_gdb(testDir, testSuite['GDBName'])
+        #the second run updates the gdb of the first, unchanged records are kept
+        for runName in ["Fresh gdb", "Second run"]:
+            ImportCameo.zips_to_gdb(sources, outGdb)
+            arcpy.env.workspace = outGdb
+            expectedTables = dict(testSuite['FeatureClasses'], **testSuite['Tables'])
+            for tableName, tableDict in sorted(expectedTables.items()):
+                if "__ATTACH" in tableName:
+                    continue
+                actual = int(arcpy.management.GetCount(tableName)[0])
+                expected = tableDict['Count']
+                test1 = actual == expected
+                print("{} {}: \nExpected Count: {} | Actual Count: {} | {}".format(runName, tableName, expected, actual, test1))
+                if test1 == False:
+                    errorCount += 1
+    finally:
+        ImportCameo.INCREMENTAL_UPDATE, ImportCameo.DIRECT_WRITE = settings
+    arcpy.management.Delete(testSuite['GDBPath'])
+    return errorCount
+
 arcpy.ImportToolbox(toolBoxPath)
 
 suiteList = [mockCAMEO_suite,sampleCAMEO_suite,combinedCAMEO_suite]
@@ -1646,5 +1678,10 @@ for suite in suiteList:
     totalErrors += errCount
     arcpy.management.Delete(suite['GDBPath'])
 
+#the record ids of a single zip are unique so incremental mode keeps every row
+if arcpy.Exists(mockCAMEO_suite['GDBPath']):
+    arcpy.management.Delete(mockCAMEO_suite['GDBPath'])
+totalErrors += incremental_tests(mockCAMEO_suite)
+
 if totalErrors > 0:
     sys.exit(1)
\ No newline at end of file